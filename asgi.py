@@ -0,0 +1,195 @@
+import logging
+from contextlib import asynccontextmanager
+from a2wsgi import WSGIMiddleware
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+from app import app as flask_app, broadcaster
+from config import engine_options, is_sqlite_file, listen_sqlite_pragmas
+from metrics import start_request, finish_request
+from models import Tournament, PHASE_GROUP, PHASE_TIEBREAK
+from pairing import tiebreaker_pairings
+from rankings import get_rankings, cached_finished_version
+from serializers import find_round, load_round_matches, serialize_matches, player_names, serialize_pairing
+from standings import group_rankings
+
+# Async serving mode, run with `uvicorn asgi:app`. The read endpoints that scoreboards and spectators
+# poll are served here from SQLAlchemy's async engine, so a waiting connection costs a coroutine rather
+# than a worker thread. The events stream is served here as well, so open streams never take up the
+# thread pool that a2wsgi runs every other route of the Flask app in, WSGI_WORKERS threads.
+# The views share their queries with app.py: they run in the sync facade of the AsyncSession, whose
+# statements still go through the async driver
+#
+# Needs the asgi extra: starlette, a2wsgi, uvicorn, and aiosqlite or aiomysql for the database
+
+log = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'mysql': 'mysql+aiomysql',
+}
+
+
+def async_engine(config):
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver for {url.get_backend_name()} databases")
+    if url.get_backend_name() == 'sqlite' and not is_sqlite_file(url):
+        # An in-memory database would be a different, empty one for each engine
+        raise RuntimeError("The async serving mode needs a SQLite file or a database server")
+    engine = create_async_engine(url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]), **engine_options(config))
+    if is_sqlite_file(url):
+        listen_sqlite_pragmas(engine.sync_engine, config)
+    return engine
+
+
+engine = async_engine(flask_app.config)
+
+
+def json_response(data, status=200):
+    # Same bytes as Flask's jsonify with the app's JSON settings
+    provider = flask_app.json
+    dump_args = {"indent": 2} if provider.compact is False or (provider.compact is None and flask_app.debug) else {"separators": (",", ":")}
+    return Response(provider.dumps(data, **dump_args) + "\n", status_code=status, media_type=provider.mimetype)
+
+
+def tournament_read(endpoint, view, cached_version=None):
+    # Async counterpart of a Flask view wrapped in versioning.tournament_etag: a 304 while the
+    # tournament's version still matches If-None-Match, otherwise view(session, tournament_id, params)
+    # -> (data, status), run in one greenlet against the async engine. A view serving cached data
+    # returns (data, status, version) with the version that data was read at, for the ETag
+    async def handler(request):
+        start_request(endpoint)
+        tournament_id = request.path_params['tournament_id']
+        params = {**request.query_params, **request.path_params}
+        etag = None
+        try:
+            async with AsyncSession(engine) as session:
+                version = cached_version(tournament_id) if cached_version else None
+                if version is None:
+                    # Loaded whole, so the view gets it from the session's identity map
+                    tournament = await session.get(Tournament, tournament_id)
+                    version = tournament.version if tournament else None
+                if version is not None:
+                    etag = f"{tournament_id}.{version}"
+                if etag is not None and etag in parse_etags(request.headers.get('if-none-match')):
+                    response = Response(status_code=304)
+                else:
+                    data, status, *served_version = await session.run_sync(view, tournament_id, params)
+                    response = json_response(data, status)
+                    if served_version and served_version[0] is not None:
+                        etag = f"{tournament_id}.{served_version[0]}"
+        except Exception:
+            log.exception("Unexpected error in %s", endpoint)
+            response = json_response({"error": "An unexpected error occurred"}, 500)
+        if etag is not None and response.status_code in (200, 304):
+            response.headers['ETag'] = f'"{etag}"'
+            response.headers['Cache-Control'] = 'no-cache'
+        finish_request(endpoint, request.method, response.status_code)
+        return response
+    return handler
+
+
+def int_param(params, key):
+    # Like Flask's request.args.get(key, type=int)
+    try:
+        return int(params[key])
+    except (KeyError, ValueError):
+        return None
+
+
+def matches_view(session, tournament_id, params):
+    round_number = int_param(params, 'round_number')
+    if round_number is None:
+        tournament = session.get(Tournament, tournament_id)
+        round_id = tournament.current_round_id if tournament else None
+    else:
+        current_round = find_round(tournament_id, round_number, session)
+        round_id = current_round.round_id if current_round else None
+    if round_id is None:
+        return {"error": "No matches found for the current round"}, 404
+    matches = load_round_matches(round_id, session)
+    if not matches:
+        return {"error": "No matches found for the current round"}, 404
+    return serialize_matches(matches), 200
+
+
+def round_view(session, tournament_id, params):
+    round_instance = find_round(tournament_id, params['round_number'], session)
+    if not round_instance:
+        return {"error": "Round not found"}, 404
+    matches = load_round_matches(round_instance.round_id, session)
+    if not matches:
+        return {"error": "No matches found for this round"}, 404
+    return {
+        "round_id": round_instance.round_id,
+        "round_number": round_instance.round_number,
+        "matches": serialize_matches(matches)
+    }, 200
+
+
+def rankings_view(session, tournament_id, params):
+    version = cached_finished_version(tournament_id)
+    if version is None:
+        tournament = session.get(Tournament, tournament_id)
+        version = tournament.version if tournament else None
+    rankings, version = get_rankings(tournament_id, session, version)
+    return rankings, 200, version
+
+
+def tiebreakers_view(session, tournament_id, params):
+    tournament = session.get(Tournament, tournament_id)
+    if not tournament or tournament.current_round_id is None:
+        return {"error": "No current round found"}, 404
+    if tournament.phase not in (PHASE_GROUP, PHASE_TIEBREAK):
+        return {"tiebreakers": []}, 200
+    pairings = tiebreaker_pairings(group_rankings(tournament_id, session), tournament.advancing_players)
+    names = player_names((player_id for pairing in pairings for player_id in pairing.player_ids()), session)
+    return {"tiebreakers": [serialize_pairing(pairing, names) for pairing in pairings]}, 200
+
+
+async def tournament_events(request):
+    # Counterpart of app.tournament_events, streaming from the same broadcaster on the event loop
+    start_request('tournament_events')
+    tournament_id = request.path_params['tournament_id']
+    try:
+        async with AsyncSession(engine) as session:
+            tournament = await session.get(Tournament, tournament_id)
+    except Exception:
+        log.exception("Unexpected error in %s", 'tournament_events')
+        response = json_response({"error": "An unexpected error occurred"}, 500)
+    else:
+        if tournament is None:
+            response = json_response({"error": "Tournament not found"}, 404)
+        else:
+            response = StreamingResponse(broadcaster.stream_async(tournament_id), media_type='text/event-stream')
+            response.headers['Cache-Control'] = 'no-cache'
+            response.headers['X-Accel-Buffering'] = 'no'
+    finish_request('tournament_events', request.method, response.status_code)
+    return response
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await engine.dispose()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/tournaments/{tournament_id:int}/matches', tournament_read('get_matches', matches_view), methods=['GET']),
+        Route('/api/tournaments/{tournament_id:int}/rounds/{round_number:int}', tournament_read('get_round_by_number', round_view), methods=['GET']),
+        Route('/api/tournaments/{tournament_id:int}/rankings', tournament_read('get_player_rankings', rankings_view, cached_finished_version), methods=['GET']),
+        Route('/api/tournaments/{tournament_id:int}/tiebreakers/check', tournament_read('check_tiebreakers', tiebreakers_view), methods=['GET']),
+        Route('/api/tournaments/{tournament_id:int}/events', tournament_events, methods=['GET']),
+        Mount('/', WSGIMiddleware(flask_app, workers=flask_app.config['WSGI_WORKERS'])),
+    ],
+    # Flask-CORS only sees the requests that reach the Flask app
+    middleware=[Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'], expose_headers=['ETag'])],
+    lifespan=lifespan,
+)
@@ -0,0 +1,159 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Spectator load against the sync Flask server and the async serving mode of asgi.py. Every spectator
+# keeps one connection open and polls the scoreboard endpoints of a running tournament every few
+# seconds; both servers run as subprocesses on the same SQLite file
+
+SERVERS = {
+    # What `python app.py` runs, minus the debugger and reloader: one thread per connection
+    'sync': lambda port: [sys.executable, '-c', f"from app import app; app.run(port={port}, threaded=True)"],
+    'asgi': lambda port: [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--log-level', 'error', '--no-access-log'],
+}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else None
+
+
+def prepare_database(args):
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Player, GroupStageFormat, KnockOutStageFormat
+
+    with app.app_context():
+        db.create_all()
+        for format_id in (1, 2, 3):
+            db.session.add(GroupStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+            db.session.add(KnockOutStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+        db.session.execute(insert(Player), [{"player_id": i, "name": f"Player {i}", "name_normalized": f"player {i}"} for i in range(1, args.players + 1)])
+        db.session.commit()
+
+    client = app.test_client()
+    tournament_id = client.post('/api/create-tournament', json={
+        "name": "Spectators",
+        "group_stage_format_id": "2",
+        "knock_out_stage_format_id": 2,
+        "num_groups": max(1, args.players // 8),
+        "advancing_players": 2,
+        "players": list(range(1, args.players + 1)),
+    }).get_json()["tournament_id"]
+    # Half the group stage is played, so every endpoint has something to show
+    matches = client.get(f'/api/tournaments/{tournament_id}/matches').get_json()
+    client.put(f'/api/tournaments/{tournament_id}/results', json=[
+        {"match_id": match["match_id"], "winner_id": match["player1"]["player_id"]} for match in matches[::2]
+    ])
+    return tournament_id
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}:\n{process.stderr.read().decode()[-2000:]}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Server did not listen on port {port}")
+
+
+async def spectate(client, urls, args, deadline, latencies, errors):
+    etags = {}
+    # Spread the first polls over one interval, as spectators don't all open the page at once
+    await asyncio.sleep(random.uniform(0, args.interval))
+    while True:
+        poll_start = time.monotonic()
+        for url in urls:
+            if time.monotonic() >= deadline:
+                return
+            headers = {"If-None-Match": etags[url]} if args.conditional and url in etags else {}
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+            except Exception as e:
+                errors.append(type(e).__name__)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code not in (200, 304):
+                errors.append(response.status_code)
+            elif 'etag' in response.headers:
+                etags[url] = response.headers['etag']
+        await asyncio.sleep(max(0, args.interval - (time.monotonic() - poll_start)))
+
+
+async def run_load(port, tournament_id, args):
+    import httpx
+
+    urls = [
+        f'/api/tournaments/{tournament_id}/matches',
+        f'/api/tournaments/{tournament_id}/rounds/1',
+        f'/api/tournaments/{tournament_id}/rankings',
+        f'/api/tournaments/{tournament_id}/tiebreakers/check',
+    ]
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=args.spectators, max_keepalive_connections=args.spectators)
+    async with httpx.AsyncClient(base_url=f'http://127.0.0.1:{port}', limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        deadline = time.monotonic() + args.seconds
+        await asyncio.gather(*(spectate(client, urls, args, deadline, latencies, errors) for _ in range(args.spectators)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 0.95) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "errors": len(errors),
+        "first_errors": [str(error) for error in errors[:5]],
+    }
+
+
+def run_server(mode, env, tournament_id, args):
+    port = free_port()
+    process = subprocess.Popen(SERVERS[mode](port), env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        wait_for_port(port, process)
+        return {"mode": mode, **asyncio.run(run_load(port, tournament_id, args))}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the sync server with the ASGI mode under many polling spectators")
+    parser.add_argument('--spectators', type=int, default=500, help="Concurrent connections, each polling the four scoreboard endpoints")
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--interval', type=float, default=2, help="Seconds between the polls of one spectator, 0 polls as fast as the server answers")
+    parser.add_argument('--players', type=int, default=64)
+    parser.add_argument('--conditional', action='store_true', help="Revalidate with If-None-Match like the frontend, mostly answered with 304")
+    parser.add_argument('--timeout', type=float, default=30, help="Seconds a request may take before it counts as an error")
+    parser.add_argument('--modes', type=lambda value: value.split(','), default=list(SERVERS))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+        os.environ['DATABASE_URL'] = f"sqlite:///{directory}/spectators.db"
+        tournament_id = prepare_database(args)
+        env = dict(os.environ, LOG_LEVEL='ERROR')
+        results = [run_server(mode, env, tournament_id, args) for mode in args.modes]
+
+    print(json.dumps({"spectators": args.spectators, "seconds": args.seconds, "interval": args.interval, "players": args.players,
+                      "conditional": args.conditional, "results": results}, indent=2))
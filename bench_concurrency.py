@@ -0,0 +1,144 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# Concurrent scorekeepers against different database setups. Every setup runs in its own process,
+# since the engine is configured once when app.py is imported
+
+# Journal mode, sync level and mmap the app ran SQLite with before they became configurable;
+# the 5 s busy wait is the sqlite3 driver's default
+SQLITE_DRIVER_DEFAULTS = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    'SQLITE_MMAP_SIZE': '0',
+}
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else None
+
+
+def run_worker(args):
+    from flask import got_request_exception
+    from sqlalchemy import insert
+    from app import app
+    from models import db, Player, GroupStageFormat, KnockOutStageFormat
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        for format_id in (1, 2, 3):
+            db.session.add(GroupStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+            db.session.add(KnockOutStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+        db.session.execute(insert(Player), [{"player_id": i, "name": f"Player {i}", "name_normalized": f"player {i}"} for i in range(1, args.players + 1)])
+        db.session.commit()
+        journal_mode = db.session.connection().exec_driver_sql("PRAGMA journal_mode").scalar() if db.engine.dialect.name == 'sqlite' else None
+
+    client = app.test_client()
+    tournament_id = client.post('/api/create-tournament', json={
+        "name": "Concurrency",
+        "group_stage_format_id": "2",
+        "knock_out_stage_format_id": 2,
+        "num_groups": max(1, args.players // 8),
+        "advancing_players": 2,
+        "players": list(range(1, args.players + 1)),
+    }).get_json()["tournament_id"]
+    matches = client.get(f'/api/tournaments/{tournament_id}/matches').get_json()
+
+    write_latencies, read_latencies, errors, exceptions = [], [], [], []
+    lock = threading.Lock()
+    # Unhandled errors only reach the client as an HTML 500 page, so collect the exceptions themselves
+    got_request_exception.connect(lambda sender, exception, **extra: exceptions.append(str(exception)), app, weak=False)
+    writers_done = threading.Event()
+
+    def write(assigned):
+        writer = app.test_client()
+        for match in assigned:
+            start = time.perf_counter()
+            response = writer.put(f"/api/matches/{match['match_id']}", json={"winner_id": match["player1"]["player_id"]})
+            elapsed = time.perf_counter() - start
+            with lock:
+                write_latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    def read():
+        reader = app.test_client()
+        while not writers_done.is_set():
+            start = time.perf_counter()
+            response = reader.get(f'/api/tournaments/{tournament_id}/rounds/1/matches')
+            elapsed = time.perf_counter() - start
+            with lock:
+                read_latencies.append(elapsed)
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+
+    writers = [threading.Thread(target=write, args=(matches[i::args.writers],)) for i in range(args.writers)]
+    readers = [threading.Thread(target=read) for _ in range(args.readers)]
+    start = time.perf_counter()
+    for thread in writers + readers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    writers_done.set()
+    for thread in readers:
+        thread.join()
+
+    return {
+        "journal_mode": journal_mode,
+        "matches": len(matches),
+        "seconds": elapsed,
+        "writes_per_second": len(write_latencies) / elapsed,
+        "reads_per_second": len(read_latencies) / elapsed,
+        "write_p50_ms": percentile(write_latencies, 0.5) * 1000,
+        "write_p95_ms": percentile(write_latencies, 0.95) * 1000,
+        "write_max_ms": max(write_latencies) * 1000,
+        "read_p50_ms": percentile(read_latencies, 0.5) * 1000 if read_latencies else None,
+        "errors": len(errors),
+        "locked_errors": sum('database is locked' in exception for exception in exceptions),
+        "first_exception": exceptions[0][:300] if exceptions else None,
+    }
+
+
+def run_setup(name, env, args):
+    worker_env = dict(os.environ, **env, LOG_LEVEL='ERROR')
+    command = [sys.executable, __file__, '--worker', '--players', str(args.players), '--writers', str(args.writers), '--readers', str(args.readers)]
+    output = subprocess.run(command, env=worker_env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"{name} failed:\n{output.stderr[-2000:]}")
+    return {"setup": name, **json.loads(output.stdout)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare database setups under concurrent result writes and round reads")
+    parser.add_argument('--players', type=int, default=64, help="Entrants of the round robin whose results are written")
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--mysql-url', help="Also run against this MySQL database, which is dropped and recreated")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args)))
+        sys.exit(0)
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        setups = [
+            ('sqlite-driver-defaults', dict(SQLITE_DRIVER_DEFAULTS, DATABASE_URL=f"sqlite:///{directory}/defaults.db")),
+            ('sqlite-wal', {"DATABASE_URL": f"sqlite:///{directory}/wal.db"}),
+        ]
+        if args.mysql_url:
+            setups.append(('mysql-pooled', {"DATABASE_URL": args.mysql_url}))
+        for name, env in setups:
+            results.append(run_setup(name, env, args))
+
+    print(json.dumps({"players": args.players, "writers": args.writers, "readers": args.readers, "results": results}, indent=2))
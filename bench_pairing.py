@@ -0,0 +1,54 @@
+import argparse
+import random
+import time
+from pairing import random_pairings, knockout_pairings, elimination_pairings, tiebreaker_pairings, KNOCK_OUT_DOUBLE_ELIMINATION, WINNERS_BRACKET, LOSERS_BRACKET
+
+
+def make_group_rankings(rng, num_groups, group_size):
+    rankings = []
+    player_id = 1
+    for group_id in range(1, num_groups + 1):
+        player_ids = list(range(player_id, player_id + group_size))
+        # Few distinct point totals, so the tiebreaker search has ties to find
+        points = sorted((rng.randrange(group_size // 2 + 1) for _ in player_ids), reverse=True)
+        rankings.append((group_id, player_ids, points))
+        player_id += group_size
+    return rankings
+
+
+def make_active_players(rng, num_players):
+    # Mid-knockout field of a double elimination: about half the players have lost once
+    return [(player_id, WINNERS_BRACKET if rng.random() < 0.5 else LOSERS_BRACKET) for player_id in range(1, num_players + 1)]
+
+
+def bench(name, decide, seconds):
+    # A decision is one pairing produced
+    decisions = 0
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        decisions += len(decide())
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            break
+    print(f"{name:<28} {decisions / elapsed:>12,.0f} decisions/s  {calls / elapsed:>10,.0f} calls/s")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time the pairing engine on synthetic inputs, without a database")
+    parser.add_argument('--players', type=int, default=256)
+    parser.add_argument('--groups', type=int, default=16)
+    parser.add_argument('--advancing', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=1.0, help="Run time per benchmark")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    player_ids = list(range(1, args.players + 1))
+    group_rankings = make_group_rankings(rng, args.groups, args.players // args.groups)
+    active_players = make_active_players(rng, args.players)
+
+    bench('random_pairings', lambda: random_pairings(player_ids, rng), args.seconds)
+    bench('knockout_pairings', lambda: knockout_pairings(group_rankings, args.advancing), args.seconds)
+    bench('elimination_pairings', lambda: elimination_pairings(KNOCK_OUT_DOUBLE_ELIMINATION, active_players, rng), args.seconds)
+    bench('tiebreaker_pairings', lambda: tiebreaker_pairings(group_rankings, args.advancing), args.seconds)
@@ -0,0 +1,200 @@
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+# Runs whole tournaments through the Flask endpoints against an in-memory SQLite database and
+# writes the timings as JSON, so runs before and after a change can be compared
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import sqlalchemy
+from sqlalchemy import event, insert
+from app import app
+from models import db, Player, GroupStageFormat, KnockOutStageFormat
+from rankings import invalidate_rankings
+from lookups import invalidate_lookups
+
+DEFAULT_SIZES = [8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096]
+QUICK_SIZES = [8, 32, 128]
+GROUP_STAGE_FORMATS = [1, 2, 3]
+KNOCK_OUT_STAGE_FORMATS = [2, 3]
+# Results are submitted through the batch endpoint in chunks of this many matches
+RESULTS_PER_REQUEST = 500
+
+
+class Recorder:
+    # Collects wall time and SQL statement counts per operation of one scenario
+    def __init__(self):
+        self.timings = {}
+        self.queries = 0
+
+    def count_query(self, *args):
+        self.queries += 1
+
+    def call(self, operation, method, url, expected_status=(200, 201), **kwargs):
+        queries = self.queries
+        start = time.perf_counter()
+        response = getattr(client, method)(url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if response.status_code not in expected_status:
+            raise RuntimeError(f"{method.upper()} {url} returned {response.status_code}: {response.get_data(as_text=True)[:200]}")
+        timing = self.timings.setdefault(operation, {"samples": [], "queries": 0})
+        timing["samples"].append(elapsed)
+        timing["queries"] += self.queries - queries
+        return response.get_json()
+
+    def summary(self):
+        return {operation: {
+            "calls": len(timing["samples"]),
+            "total": sum(timing["samples"]),
+            "min": min(timing["samples"]),
+            "median": statistics.median(timing["samples"]),
+            "max": max(timing["samples"]),
+            "queries_per_call": timing["queries"] / len(timing["samples"]),
+        } for operation, timing in self.timings.items()}
+
+
+def reset_database(num_players):
+    db.drop_all()
+    db.create_all()
+    for format_id in (1, 2, 3):
+        db.session.add(GroupStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+        db.session.add(KnockOutStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+    db.session.execute(insert(Player), [{"player_id": i, "name": f"Player {i}", "name_normalized": f"player {i}"} for i in range(1, num_players + 1)])
+    db.session.commit()
+    # Ids start over with every fresh database, so nothing cached for an earlier scenario may survive
+    invalidate_lookups()
+
+
+def pick_results(rng, matches):
+    results = []
+    for match in matches:
+        players = [match[key]["player_id"] for key in ("player1", "player2", "player3") if match[key]]
+        rng.shuffle(players)
+        results.append({"match_id": match["match_id"], "winner_id": players[0], "second_place_id": players[1] if len(players) == 3 else None})
+    return results
+
+
+def submit_results(recorder, rng, tournament_id, matches):
+    results = pick_results(rng, matches)
+    for i in range(0, len(results), RESULTS_PER_REQUEST):
+        recorder.call('submit_results', 'put', f'/api/tournaments/{tournament_id}/results', json=results[i:i + RESULTS_PER_REQUEST])
+
+
+def run_scenario(rng, num_players, group_stage_format_id, knock_out_stage_format_id, group_size, repeat, max_rounds):
+    recorder = Recorder()
+    reset_database(num_players)
+    event.listen(db.engine, 'before_cursor_execute', recorder.count_query)
+    try:
+        num_groups = max(1, math.ceil(num_players / group_size))
+        created = recorder.call('create_tournament', 'post', '/api/create-tournament', json={
+            "name": f"Benchmark {num_players}",
+            "group_stage_format_id": str(group_stage_format_id),
+            "knock_out_stage_format_id": knock_out_stage_format_id,
+            "num_groups": num_groups,
+            "advancing_players": 2,
+            "players": list(range(1, num_players + 1)),
+        })
+        tournament_id = created["tournament_id"]
+        invalidate_rankings(tournament_id)
+
+        rounds_played = 0
+        while True:
+            rounds_played += 1
+            for _ in range(repeat):
+                recorder.call('get_round_by_number', 'get', f'/api/tournaments/{tournament_id}/rounds/{rounds_played}')
+                recorder.call('get_round_matches', 'get', f'/api/tournaments/{tournament_id}/rounds/{rounds_played}/matches')
+            matches = recorder.call('get_matches', 'get', f'/api/tournaments/{tournament_id}/matches')
+            submit_results(recorder, rng, tournament_id, matches)
+
+            if rounds_played == 1 and group_stage_format_id != 1:
+                # Tiebreakers are played until the advancing spots are decided
+                for _ in range(3):
+                    check = recorder.call('check_tiebreakers', 'get', f'/api/tournaments/{tournament_id}/tiebreakers/check')
+                    if not check["tiebreakers"]:
+                        break
+                    tiebreakers = recorder.call('create_tiebreakers', 'post', f'/api/tournaments/{tournament_id}/tiebreakers')
+                    submit_results(recorder, rng, tournament_id, tiebreakers["tiebreakers"])
+
+            for _ in range(repeat):
+                invalidate_rankings(tournament_id)
+                recorder.call('get_player_rankings', 'get', f'/api/tournaments/{tournament_id}/rankings')
+
+            if rounds_played >= max_rounds:
+                break
+            # The call after the last round creates nothing and reports the tournament finished
+            if recorder.call('next_round', 'post', f'/api/next-round/{tournament_id}').get('finished'):
+                break
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', recorder.count_query)
+
+    return {
+        "players": num_players,
+        "group_stage_format_id": group_stage_format_id,
+        "knock_out_stage_format_id": knock_out_stage_format_id,
+        "num_groups": num_groups if group_stage_format_id != 1 else 0,
+        "rounds": rounds_played,
+        "operations": recorder.summary(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Time tournament creation, rounds, tiebreakers and rankings on in-memory SQLite")
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in value.split(',')], help="Comma separated entrant counts")
+    parser.add_argument('--quick', action='store_true', help=f"Only {', '.join(map(str, QUICK_SIZES))} entrants")
+    parser.add_argument('--group-stage-formats', type=lambda value: [int(f) for f in value.split(',')], default=GROUP_STAGE_FORMATS)
+    parser.add_argument('--knock-out-stage-formats', type=lambda value: [int(f) for f in value.split(',')], default=KNOCK_OUT_STAGE_FORMATS)
+    parser.add_argument('--group-size', type=int, default=8, help="Players per group when there is a group stage")
+    parser.add_argument('--repeat', type=int, default=3, help="Calls per read endpoint and round")
+    parser.add_argument('--max-rounds', type=int, default=64, help="Rounds played at most; a tournament otherwise runs until it is finished")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="JSON file to write, stdout by default")
+    args = parser.parse_args()
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    random.seed(args.seed)
+    rng = random.Random(args.seed)
+    app.testing = True
+    client = app.test_client()
+
+    scenarios = []
+    with app.app_context():
+        for num_players in sizes:
+            for group_stage_format_id in args.group_stage_formats:
+                for knock_out_stage_format_id in args.knock_out_stage_formats:
+                    start = time.perf_counter()
+                    scenario = run_scenario(rng, num_players, group_stage_format_id, knock_out_stage_format_id, args.group_size, args.repeat, args.max_rounds)
+                    scenario["seconds"] = time.perf_counter() - start
+                    scenarios.append(scenario)
+                    print(f"{num_players:>5} players  group format {group_stage_format_id}  knockout format {knock_out_stage_format_id}  "
+                          f"{scenario['rounds']:>2} rounds  {scenario['seconds']:.2f}s", file=sys.stderr)
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlalchemy": sqlalchemy.__version__,
+        "database": os.environ['DATABASE_URL'],
+        "seed": args.seed,
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
@@ -0,0 +1,157 @@
+import logging
+from sqlalchemy import exists, or_
+from sqlalchemy.orm import aliased
+from models import db, BracketSlot, Match
+from pairing import bracket_layout, drops_loser, GRAND_FINAL
+
+log = logging.getLogger(__name__)
+
+
+def create_bracket(tournament_id, seeded_player_ids, double_elimination=False):
+    # Persists the slot tree for the seeds in order, best first, and settles the byes, in the caller's
+    # transaction. The first-round matches are left to create_bracket_round
+    layout = bracket_layout(len(seeded_player_ids), double_elimination)
+    pending = [0] * len(layout)
+    for spec in layout:
+        for target in (spec.winner_to, spec.loser_to):
+            if target is not None:
+                pending[target] += 1
+
+    slots = [BracketSlot(
+        tournament_id=tournament_id,
+        bracket=spec.bracket,
+        bracket_round=spec.bracket_round,
+        position=spec.position,
+        seed1=spec.seed1,
+        seed2=spec.seed2,
+        player1_id=seeded_player_ids[spec.seed1 - 1] if spec.seed1 else None,
+        player2_id=seeded_player_ids[spec.seed2 - 1] if spec.seed2 else None,
+        pending_entries=entries,
+        winner_to_position=spec.winner_to_position,
+        loser_to_position=spec.loser_to_position
+    ) for spec, entries in zip(layout, pending)]
+    for slot, spec in zip(slots, layout):
+        slot.winner_to = slots[spec.winner_to] if spec.winner_to is not None else None
+        slot.loser_to = slots[spec.loser_to] if spec.loser_to is not None else None
+    db.session.add_all(slots)
+
+    for slot, entries in zip(slots, pending):
+        if entries == 0:
+            settle(slot)
+    db.session.flush()
+    return slots
+
+
+def enter(slot, position, player_id):
+    # An entrant, or None for one that will never come (the loser of a bye), arrives at position
+    if player_id is not None:
+        setattr(slot, f'player{position}_id', player_id)
+    slot.pending_entries -= 1
+    if slot.pending_entries == 0:
+        settle(slot)
+
+
+def settle(slot):
+    # With every entrant in, a slot with a single player is a bye and passes them straight on
+    players = [player_id for player_id in (slot.player1_id, slot.player2_id) if player_id is not None]
+    if len(players) < 2:
+        resolve(slot, players[0] if players else None, None)
+
+
+def moving_loser(slot, winner_id, loser_id):
+    # The loser who moves on to loser_to; after a grand final the winners bracket champion won,
+    # nobody, so that the reset becomes a bye for them
+    return loser_id if drops_loser(slot.bracket, 1 if winner_id == slot.player1_id else 2) else None
+
+
+def resolve(slot, winner_id, loser_id):
+    slot.winner_id = winner_id
+    loser_id = moving_loser(slot, winner_id, loser_id)
+    if slot.winner_to is not None:
+        enter(slot.winner_to, slot.winner_to_position, winner_id)
+    if slot.loser_to is not None:
+        enter(slot.loser_to, slot.loser_to_position, loser_id)
+
+
+def replace_entry(slot, position, player_id):
+    # Swaps the player at position after a corrected result; a slot that was played already keeps
+    # its entrant. Returns whether the correction could be carried through
+    if slot.match_id is not None:
+        return False
+    setattr(slot, f'player{position}_id', player_id)
+    if slot.winner_id is not None:
+        # A bye that passed the previous entrant on
+        slot.winner_id = player_id
+        if slot.winner_to is not None:
+            return replace_entry(slot.winner_to, slot.winner_to_position, player_id)
+    return True
+
+
+def redo_grand_final(slot, winner_id, loser_id):
+    # After a corrected grand final the reset is played or skipped afresh, unless it was played already
+    reset = slot.winner_to
+    if reset.match_id is not None:
+        return False
+    setattr(reset, f'player{slot.winner_to_position}_id', winner_id)
+    setattr(reset, f'player{slot.loser_to_position}_id', moving_loser(slot, winner_id, loser_id))
+    reset.winner_id = None
+    settle(reset)
+    return True
+
+
+def record_bracket_results(changed_matches):
+    # Counterpart of standings.record_results for the knockout: each decided match moves its winner,
+    # and in double elimination its loser, into the next slot, one primary-key fetch per result
+    knockout = {match.match_id: match for match, _, _ in changed_matches if match.group_id is None}
+    if not knockout:
+        return
+    for slot in BracketSlot.query.filter(BracketSlot.match_id.in_(knockout)):
+        match = knockout[slot.match_id]
+        winner_id = match.winner_id
+        if winner_id is None or winner_id == slot.winner_id:
+            continue
+        if winner_id not in (slot.player1_id, slot.player2_id):
+            log.warning("Winner %s is not an entrant of bracket slot %d", winner_id, slot.slot_id, extra={"tournament_id": slot.tournament_id})
+            continue
+        loser_id = slot.player2_id if winner_id == slot.player1_id else slot.player1_id
+        if slot.winner_id is None:
+            resolve(slot, winner_id, loser_id)
+            continue
+
+        slot.winner_id = winner_id
+        carried = True
+        if slot.bracket == GRAND_FINAL and slot.winner_to is not None:
+            carried = redo_grand_final(slot, winner_id, loser_id)
+        else:
+            if slot.winner_to is not None:
+                carried = replace_entry(slot.winner_to, slot.winner_to_position, winner_id) and carried
+            if slot.loser_to is not None:
+                carried = replace_entry(slot.loser_to, slot.loser_to_position, loser_id) and carried
+        if not carried:
+            log.warning("Corrected result of match %d reached bracket slots that were played already", slot.match_id, extra={"tournament_id": slot.tournament_id})
+
+
+def has_bracket(tournament_id):
+    return db.session.query(exists().where(BracketSlot.tournament_id == tournament_id)).scalar()
+
+
+def ready_slots(tournament_id):
+    # Slots with both entrants known and no match yet: the next wave of the bracket
+    return BracketSlot.query.filter(
+        BracketSlot.tournament_id == tournament_id,
+        BracketSlot.match_id.is_(None),
+        BracketSlot.player1_id.isnot(None),
+        BracketSlot.player2_id.isnot(None)
+    ).order_by(BracketSlot.bracket.desc(), BracketSlot.bracket_round, BracketSlot.position).all()  # W, L, then F
+
+
+def feeds_next_slot():
+    # Column for match queries: whether the match's winner moves on to another match in the bracket, so
+    # a lone match in the last round isn't taken for the final. A grand final the winners bracket
+    # champion won only leads to a reset they got as a bye
+    next_slot = aliased(BracketSlot)
+    return exists().where(
+        BracketSlot.match_id == Match.match_id,
+        next_slot.slot_id == BracketSlot.winner_to_slot_id,
+        or_(next_slot.match_id.isnot(None), next_slot.winner_id.is_(None))
+    )
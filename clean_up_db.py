@@ -1,11 +1,22 @@
-from models import db, Player, Tournament, Group, GroupPlayer, Round, Match
+from models import db, Player, Tournament, Group, GroupPlayer, GroupStanding, Round, Match, BracketSlot, KnockoutPlayer, \
+    PlayerStats, PlayerRating, RatingChange, IdempotencyKey
 from app import app
 
 def clean_database_except_player():
     with app.app_context(): 
         try:
             # Delete all entries from tables except for Player
+            # Career stats and ratings only come from the matches; their rows are added again as players play
+            db.session.query(PlayerStats).delete()
+            db.session.query(RatingChange).delete()
+            db.session.query(PlayerRating).delete()
+            db.session.query(IdempotencyKey).delete()
+            db.session.query(KnockoutPlayer).delete()
+            # Slots point at each other; unlinked first so no row is deleted while another still refers to it
+            db.session.query(BracketSlot).update({BracketSlot.winner_to_slot_id: None, BracketSlot.loser_to_slot_id: None})
+            db.session.query(BracketSlot).delete()
             db.session.query(Match).delete()
+            db.session.query(GroupStanding).delete()
             db.session.query(GroupPlayer).delete()
             db.session.query(Group).delete()
             db.session.query(Round).delete()
@@ -0,0 +1,47 @@
+import base64
+import json
+from sqlalchemy import and_, or_, select
+from models import db, Player, normalize_name
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(player):
+    key = json.dumps([player.name_normalized, player.player_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        name_normalized, player_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(name_normalized, str) or not isinstance(player_id, int):
+        raise ValueError("Invalid cursor")
+    return name_normalized, player_id
+
+
+def search_players(prefix='', limit=DEFAULT_PAGE_SIZE, after=None):
+    # One page of players ordered by (name_normalized, player_id), a range scan on
+    # ix_players_name_normalized_player_id. Returns (players, cursor of the next page or None)
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    query = select(Player.player_id, Player.name, Player.name_normalized)
+    prefix = normalize_name(prefix)
+    if prefix:
+        # A half-open range instead of LIKE, so the index is used whatever the collation
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        query = query.where(Player.name_normalized >= prefix, Player.name_normalized < upper)
+    if after:
+        name_normalized, player_id = decode_cursor(after)
+        query = query.where(or_(
+            Player.name_normalized > name_normalized,
+            and_(Player.name_normalized == name_normalized, Player.player_id > player_id),
+        ))
+    # One extra row tells whether there is a next page
+    rows = db.session.execute(query.order_by(Player.name_normalized, Player.player_id).limit(limit + 1)).all()
+
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return [{'player_id': row.player_id, 'name': row.name} for row in rows[:limit]], next_cursor
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import queue
+import threading
+from collections import defaultdict
+
+# Seconds between keep-alive comments on an idle stream, so proxies don't close it
+KEEP_ALIVE_SECONDS = 15
+# Events buffered per subscriber before a slow client is told to refetch instead
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class LocalBackend:
+    # Delivers published events straight back to this process; fine for a single worker and for tests
+    def start(self, deliver):
+        self.deliver = deliver
+
+    def publish(self, message):
+        self.deliver(message)
+
+
+class RedisBackend:
+    # Fans events out through Redis pub/sub so every worker process sees every write
+    def __init__(self, url, channel='darts:tournament-events'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis package is required for the Redis events backend")
+        self.client = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def start(self, deliver):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{self.channel: lambda item: deliver(json.loads(item['data']))})
+        pubsub.run_in_thread(sleep_time=1, daemon=True)
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+
+class AsyncSubscriber:
+    # Subscriber of a client served on an event loop. Events are delivered from the publishing thread,
+    # so they are handed over to the loop rather than put on its queue directly
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def put_nowait(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The loop has shut down; its stream is going away too
+            pass
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync", "tournament_id": message["tournament_id"]})
+
+
+class Broadcaster:
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self.backend.start(self._deliver)
+
+    def subscribe(self, tournament_id, subscriber=None):
+        subscriber = subscriber or queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[tournament_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, tournament_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(tournament_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[tournament_id]
+
+    def publish(self, tournament_id, event_type, **data):
+        self.backend.publish({"type": event_type, "tournament_id": tournament_id, **data})
+
+    def _deliver(self, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(message["tournament_id"], ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(message)
+            except queue.Full:
+                # The client fell behind; drop its backlog and have it reload the whole view
+                with subscriber.mutex:
+                    subscriber.queue.clear()
+                subscriber.put_nowait({"type": "resync", "tournament_id": message["tournament_id"]})
+
+    def stream(self, tournament_id):
+        # Generator of Server-Sent Events for one client, unsubscribing when the client goes away
+        subscriber = self.subscribe(tournament_id)
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = subscriber.get(timeout=KEEP_ALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(message)
+        finally:
+            self.unsubscribe(tournament_id, subscriber)
+
+    async def stream_async(self, tournament_id):
+        # Same stream for an ASGI server, waiting on the event loop instead of in a worker thread
+        subscriber = self.subscribe(tournament_id, AsyncSubscriber())
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.queue.get(), KEEP_ALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(message)
+        finally:
+            self.unsubscribe(tournament_id, subscriber)
+
+
+def format_event(message):
+    return f"event: {message['type']}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
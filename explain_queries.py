@@ -0,0 +1,137 @@
+import argparse
+import random
+import time
+from sqlalchemy import MetaData, create_engine, select, func, text
+from models import db, normalize_name, Player, Tournament, Group, GroupPlayer, Round, Match
+
+# Indexes added by migration a78c3ed3821e, left out with --without-indexes for comparison
+HOT_INDEXES = {
+    'uq_rounds_tournament_id_round_number',
+    'ix_matches_round_id_winner_id',
+    'ix_matches_winner_id_round_id',
+    'ix_group_players_group_id_player_id',
+    'ix_groups_tournament_id_group_number',
+}
+
+
+def build_schema(engine, without_indexes):
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if without_indexes:
+            for index in list(copy.indexes):
+                if index.name in HOT_INDEXES:
+                    copy.indexes.remove(index)
+            for constraint in list(copy.constraints):
+                if constraint.name in HOT_INDEXES:
+                    copy.constraints.remove(constraint)
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+
+def seed(engine, num_tournaments, num_players, players_per_tournament, num_groups):
+    rng = random.Random(42)
+    players = [{'player_id': i + 1, 'name': f"Player {i + 1}", 'name_normalized': normalize_name(f"Player {i + 1}")} for i in range(num_players)]
+    tournaments, groups, group_players, rounds, matches = [], [], [], [], []
+
+    for tournament_id in range(1, num_tournaments + 1):
+        tournaments.append({'tournament_id': tournament_id, 'name': f"Tournament {tournament_id}", 'advancing_players': 2})
+        group_round_id = len(rounds) + 1
+        knockout_round_id = group_round_id + 1
+        rounds.append({'round_id': group_round_id, 'tournament_id': tournament_id, 'round_number': 1})
+        rounds.append({'round_id': knockout_round_id, 'tournament_id': tournament_id, 'round_number': 2})
+
+        entrants = rng.sample(range(1, num_players + 1), players_per_tournament)
+        advancing = []
+        for g in range(num_groups):
+            group_id = len(groups) + 1
+            groups.append({'group_id': group_id, 'tournament_id': tournament_id, 'group_number': g + 1, 'group_name': f"Gruppe {g + 1}"})
+            members = entrants[g::num_groups]
+            group_players.extend({'group_id': group_id, 'player_id': player_id} for player_id in members)
+            for i in range(len(members)):
+                for j in range(i + 1, len(members)):
+                    matches.append({'tournament_id': tournament_id, 'round_id': group_round_id, 'group_id': group_id,
+                                    'player1_id': members[i], 'player2_id': members[j], 'winner_id': rng.choice((members[i], members[j]))})
+            advancing.extend(members[:2])
+
+        for i in range(0, len(advancing) - 1, 2):
+            matches.append({'tournament_id': tournament_id, 'round_id': knockout_round_id, 'group_id': None,
+                            'player1_id': advancing[i], 'player2_id': advancing[i + 1], 'winner_id': advancing[i]})
+
+    with engine.begin() as conn:
+        conn.execute(Player.__table__.insert(), players)
+        conn.execute(Tournament.__table__.insert(), tournaments)
+        conn.execute(Group.__table__.insert(), groups)
+        conn.execute(GroupPlayer.__table__.insert(), group_players)
+        conn.execute(Round.__table__.insert(), rounds)
+        conn.execute(Match.__table__.insert(), matches)
+    print(f"Seeded {len(tournaments)} tournaments, {len(group_players)} group players, {len(rounds)} rounds, {len(matches)} matches")
+
+
+# The lookups app.py runs on every request, parameterised by a tournament id
+def app_queries(tournament_id, round_id, group_id):
+    rounds, matches, groups, group_players = Round.__table__, Match.__table__, Group.__table__, GroupPlayer.__table__
+    return {
+        'round by number': select(rounds).where(rounds.c.tournament_id == tournament_id, rounds.c.round_number == 1),
+        'latest round': select(rounds).where(rounds.c.tournament_id == tournament_id).order_by(rounds.c.round_number.desc()).limit(1),
+        'round matches': select(matches).where(matches.c.round_id == round_id),
+        'round winners': select(matches.c.winner_id, func.count()).where(matches.c.round_id == round_id, matches.c.winner_id.isnot(None)).group_by(matches.c.winner_id),
+        'tournament groups': select(groups).where(groups.c.tournament_id == tournament_id).order_by(groups.c.group_number),
+        'group players': select(group_players).where(group_players.c.group_id == group_id),
+        'rankings matches won': select(matches.c.winner_id, func.count(matches.c.match_id))
+            .join(rounds, rounds.c.round_id == matches.c.round_id)
+            .where(rounds.c.tournament_id == tournament_id)
+            .group_by(matches.c.winner_id),
+        'rankings rounds reached': select(matches.c.player1_id, matches.c.player2_id, rounds.c.round_number)
+            .join(rounds, rounds.c.round_id == matches.c.round_id)
+            .where(rounds.c.tournament_id == tournament_id),
+    }
+
+
+def explain_prefix(engine):
+    if engine.dialect.name == 'sqlite':
+        return 'EXPLAIN QUERY PLAN '
+    return 'EXPLAIN '
+
+
+def explain(engine, repeat):
+    rng = random.Random(7)
+    with engine.connect() as conn:
+        num_tournaments = conn.execute(select(func.count()).select_from(Tournament.__table__)).scalar()
+        samples = []
+        for _ in range(repeat):
+            tournament_id = rng.randint(1, num_tournaments)
+            round_id = conn.execute(select(Round.__table__.c.round_id).where(Round.__table__.c.tournament_id == tournament_id).limit(1)).scalar()
+            group_id = conn.execute(select(Group.__table__.c.group_id).where(Group.__table__.c.tournament_id == tournament_id).limit(1)).scalar()
+            samples.append(app_queries(tournament_id, round_id, group_id))
+
+        for name, statement in samples[0].items():
+            sql = str(statement.compile(engine, compile_kwargs={'literal_binds': True}))
+            print(f"\n== {name}")
+            print(sql)
+            for row in conn.execute(text(explain_prefix(engine) + sql)):
+                print('   ', tuple(row))
+
+            statements = [sample[name] for sample in samples]
+            start = time.perf_counter()
+            for statement in statements:
+                conn.execute(statement).fetchall()
+            elapsed = (time.perf_counter() - start) / len(samples)
+            print(f"    mean {elapsed * 1000:.3f} ms over {len(samples)} runs")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Seed a scratch database and print query plans and timings for the app.py lookups")
+    parser.add_argument('--database-url', default='sqlite://', help="Scratch database, all tables in it are dropped (default: in-memory SQLite)")
+    parser.add_argument('--tournaments', type=int, default=10000)
+    parser.add_argument('--players', type=int, default=500)
+    parser.add_argument('--players-per-tournament', type=int, default=8)
+    parser.add_argument('--groups', type=int, default=2)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--without-indexes', action='store_true', help="Create the schema without the hot lookup indexes")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    build_schema(engine, args.without_indexes)
+    seed(engine, args.tournaments, args.players, args.players_per_tournament, args.groups)
+    explain(engine, args.repeat)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
   Box,
   Button,
@@ -15,8 +15,12 @@ import * as Yup from 'yup';
 import { useFormik } from 'formik';
 import { useNavigate } from 'react-router-dom'; // Import useNavigate for navigation
 
+const PLAYER_PAGE_SIZE = 50;
+
 const Tournament = () => {
   const [players, setPlayers] = useState([]);
+  const [playerSearch, setPlayerSearch] = useState('');
+  const [nextCursor, setNextCursor] = useState(null);
   const [selectedPlayers, setSelectedPlayers] = useState([]);
   const [groupStageFormats, setGroupStageFormats] = useState([]);
   const [knockOutStageFormats, setKnockOutStageFormats] = useState([]);
@@ -24,22 +28,53 @@ const Tournament = () => {
   const [defaultKnockOutStageFormat, setDefaultKnockOutStageFormat] = useState('');
   const navigate = useNavigate(); // Initialize useNavigate for navigation
   const [error, setError] = useState('');
+  // Kept until the tournament is created, so a double submit or a retry doesn't create it twice
+  const createKey = useRef(null);
   const [numberOfGroupsOptions, setNumberOfGroupsOptions] = useState(['Auto', ...Array.from({ length: 3 }, (_, i) => (i + 1) * 2)]);
 
+  // One page of the player directory; every keystroke asks the server instead of filtering the whole roster
+  const fetchPlayers = async (search, after, signal) => {
+    const params = new URLSearchParams({ q: search, limit: PLAYER_PAGE_SIZE });
+    if (after) {
+      params.set('after', after);
+    }
+    const response = await fetch(`/api/players?${params}`, { signal });
+    if (!response.ok) {
+      throw new Error('Network response was not ok');
+    }
+    return response.json();
+  };
+
   useEffect(() => {
-    const fetchPlayers = async () => {
+    const controller = new AbortController();
+    const timeout = setTimeout(async () => {
       try {
-        const response = await fetch('/api/players');
-        if (!response.ok) {
-          throw new Error('Network response was not ok');
-        }
-        const playersData = await response.json();
-        setPlayers(playersData);
+        const page = await fetchPlayers(playerSearch, null, controller.signal);
+        setPlayers(page.players);
+        setNextCursor(page.next_cursor);
       } catch (error) {
-        console.error('Error fetching players:', error);
+        if (error.name !== 'AbortError') {
+          console.error('Error fetching players:', error);
+        }
       }
+    }, 250);
+    return () => {
+      clearTimeout(timeout);
+      controller.abort();
     };
+  }, [playerSearch]);
+
+  const loadMorePlayers = async () => {
+    try {
+      const page = await fetchPlayers(playerSearch, nextCursor);
+      setPlayers((current) => [...current, ...page.players]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error('Error fetching players:', error);
+    }
+  };
 
+  useEffect(() => {
     const fetchGroupStageFormats = async () => {
       try {
         const response = await fetch('/api/group-stage-formats');
@@ -74,7 +109,6 @@ const Tournament = () => {
 
     fetchGroupStageFormats();
     fetchKnockOutStageFormats();
-    fetchPlayers();
   }, []);
 
     const handlePlayerToggle = (playerId) => {
@@ -128,10 +162,14 @@ const Tournament = () => {
       };
 
       try {
+        if (!createKey.current) {
+          createKey.current = crypto.randomUUID();
+        }
         const response = await fetch('/api/create-tournament', {
           method: 'POST',
           headers: {
             'Content-Type': 'application/json',
+            'Idempotency-Key': createKey.current,
           },
           body: JSON.stringify(newTournament),
         });
@@ -144,6 +182,7 @@ const Tournament = () => {
         const createdTournament = await response.json();
         console.log('Tournament created:', createdTournament); // Add log here
 
+        createKey.current = null;
         resetForm();
         setSelectedPlayers([]);
         setError('');
@@ -268,7 +307,16 @@ const Tournament = () => {
         </Box>
 
         {/* Player Selection List */}
-        <Typography variant="h6">Spieler auswählen</Typography>
+        <Typography variant="h6">Spieler auswählen ({selectedPlayers.length} ausgewählt)</Typography>
+        <TextField
+          label="Spieler suchen"
+          variant="outlined"
+          size="small"
+          fullWidth
+          value={playerSearch}
+          onChange={(event) => setPlayerSearch(event.target.value)}
+          sx={{ mb: 1 }}
+        />
         <Box
           sx={{
             maxHeight: 300,
@@ -312,6 +360,11 @@ const Tournament = () => {
               </Box>
             ))}
           </Box>
+          {nextCursor && (
+            <Box sx={{ display: 'flex', justifyContent: 'center' }}>
+              <Button onClick={loadMorePlayers}>Mehr Spieler laden</Button>
+            </Box>
+          )}
         </Box>
 
       
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import {
   Box,
@@ -24,8 +24,27 @@ const TournamentRound = () => {
   const [hasGroupPhase, setHasGroupPhase] = useState(false);
   const [isTiebreaker, setIsTiebreaker] = useState(false);
   const [hasPlayer3, setHasPlayer3] = useState(false);
+  // One Idempotency-Key per action until it succeeds, so a double click or a retry is only applied once
+  const actionKeys = useRef({});
   const navigate = useNavigate();
 
+  const actionKey = (action) => {
+    if (!actionKeys.current[action]) {
+      actionKeys.current[action] = crypto.randomUUID();
+    }
+    return actionKeys.current[action];
+  };
+
+  const setMatchVersion = (matchId, version) => {
+    setMatches((prevMatches) => prevMatches.map(match => match.match_id === matchId ? { ...match, version } : match));
+  };
+
+  const showTiebreakers = (tiebreakers) => {
+    setMatches(tiebreakers);
+    setIsTiebreaker(true);
+    setHasPlayer3(tiebreakers.some(match => match.player3 !== null));
+  };
+
   const fetchMatches = async (roundNumber) => {
     try {
       const response = await fetch(`/api/tournaments/${tournamentId}/matches?round_number=${roundNumber}`);
@@ -45,6 +64,40 @@ const TournamentRound = () => {
     fetchMatches(round);
   }, [tournamentId, round]);
 
+  // Follow results and rounds entered at other boards instead of polling
+  useEffect(() => {
+    const source = new EventSource(`/api/tournaments/${tournamentId}/events`);
+    source.addEventListener('match_updated', (event) => {
+      const data = JSON.parse(event.data);
+      setWinners((prevWinners) => ({ ...prevWinners, [data.match_id]: data.winner_id }));
+      setSecondPlaces((prevSecondPlaces) => ({ ...prevSecondPlaces, [data.match_id]: data.second_place_id }));
+      setMatchVersion(data.match_id, data.version);
+    });
+    // The round is only ever set to the absolute number the server reports, here or from the
+    // next-round response, so the board that advanced doesn't move on twice
+    source.addEventListener('round_created', (event) => {
+      setIsTiebreaker(false);
+      setRound(JSON.parse(event.data).round_number);
+    });
+    source.addEventListener('tiebreakers_created', async (event) => {
+      const matchIds = new Set(JSON.parse(event.data).match_ids);
+      try {
+        const response = await fetch(`/api/tournaments/${tournamentId}/matches?round_number=${round}`);
+        if (!response.ok) {
+          throw new Error('Network response was not ok');
+        }
+        showTiebreakers((await response.json()).filter(match => matchIds.has(match.match_id)));
+      } catch (error) {
+        console.error('Error fetching tiebreaker matches:', error);
+      }
+    });
+    source.addEventListener('tournament_finished', () => {
+      navigate(`/tournaments/${tournamentId}/winner`);
+    });
+    source.addEventListener('resync', () => fetchMatches(round));
+    return () => source.close();
+  }, [tournamentId, round]);
+
   const handleMatchUpdate = async (matchId, winnerId, secondPlaceId) => {
     setWinners((prevWinners) => ({
       ...prevWinners,
@@ -57,17 +110,25 @@ const TournamentRound = () => {
     }));
   
     try {
+      const version = matches.find(match => match.match_id === matchId)?.version;
       const response = await fetch(`/api/matches/${matchId}`, {
         method: 'PUT',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ winner_id: winnerId, second_place_id: secondPlaceId }),  // Send both IDs
+        body: JSON.stringify({ winner_id: winnerId, second_place_id: secondPlaceId, version }),  // Send both IDs
       });
   
+      if (response.status === 409) {
+        // Another board changed the match meanwhile, show its result instead
+        setError('Das Ergebnis wurde inzwischen an einem anderen Gerät geändert.');
+        fetchMatches(round);
+        return;
+      }
       if (!response.ok) {
         throw new Error('Failed to update match result');
       }
+      setMatchVersion(matchId, (await response.json()).version);
       console.log(`Match ${matchId} result updated. Winner: ${winnerId}, Second Place: ${secondPlaceId}`);
     } catch (error) {
       console.error('Error updating match result:', error);
@@ -81,57 +142,64 @@ const TournamentRound = () => {
       setError('Es sind noch nicht alle Gewinner ausgewählt.');
       return;
     }
-    if (matches.length === 1 &&  !isTiebreaker) {
-      navigate(`/tournaments/${tournamentId}/winner`);
-    } else {
-      if (round === 1) {
-        try {
-          const response = await fetch(`/api/tournaments/${tournamentId}/tiebreakers/check`, {
-            method: 'GET',
-            headers: {
-              'Content-Type': 'application/json',
-            },
-          });
-    
-          if (!response.ok) {
-            throw new Error('Failed to check tiebreakers');
-          }
-    
-          const result = await response.json();
-          console.log('Tiebreakers found:', result.tiebreakers);
-          if (result.tiebreakers.length > 0) {
-            await handleTiebreaker(); // Call the handleTiebreaker function;
-            return;
-          }
-        } catch (error) {
-          console.error('Error checking for tiebreakers:', error);
-          return;
-        }
-      }
-    
-      // No tiebreakers, proceed to next round
+    if (round === 1) {
       try {
-        const responseNextRound = await fetch(`/api/next-round/${tournamentId}`, {
-          method: 'POST',
+        const response = await fetch(`/api/tournaments/${tournamentId}/tiebreakers/check`, {
+          method: 'GET',
           headers: {
             'Content-Type': 'application/json',
           },
         });
-    
-        if (!responseNextRound.ok) {
-          throw new Error('Failed to create next round matches');
+  
+        if (!response.ok) {
+          throw new Error('Failed to check tiebreakers');
+        }
+  
+        const result = await response.json();
+        console.log('Tiebreakers found:', result.tiebreakers);
+        if (result.tiebreakers.length > 0) {
+          await handleTiebreaker(); // Call the handleTiebreaker function;
+          return;
         }
-    
-        const resultNextRound = await responseNextRound.json();
-        console.log('Next round matches created:', resultNextRound.matches);
-        
-        setIsTiebreaker(false);
-        fetchMatches(round + 1);
-        setRound(prevRound => prevRound + 1);
       } catch (error) {
-        console.error('Error creating next round matches:', error);
+        console.error('Error checking for tiebreakers:', error);
+        return;
+      }
+    }
+  
+    // No tiebreakers, proceed to next round
+    try {
+      const responseNextRound = await fetch(`/api/next-round/${tournamentId}`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          'Idempotency-Key': actionKey(`next-round-${round}`),
+        },
+        body: JSON.stringify({ round_number: round }),
+      });
+  
+      if (responseNextRound.status === 409) {
+        // Another board advanced first; the round_created event moves this one along
+        return;
+      }
+      if (!responseNextRound.ok) {
+        throw new Error('Failed to create next round matches');
       }
-    };
+  
+      const resultNextRound = await responseNextRound.json();
+      if (resultNextRound.finished) {
+        // The bracket has been played out, the last match was the final
+        navigate(`/tournaments/${tournamentId}/winner`);
+        return;
+      }
+      console.log('Next round matches created:', resultNextRound.round_number);
+
+      // Fetched by the effect on round
+      setIsTiebreaker(false);
+      setRound(resultNextRound.round_number);
+    } catch (error) {
+      console.error('Error creating next round matches:', error);
+    }
   };
 
   const handleTiebreaker = async () => {
@@ -140,18 +208,18 @@ const TournamentRound = () => {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': actionKey('tiebreakers'),
         },
       });
   
       if (!response.ok) {
         throw new Error('Failed to create tiebreaker matches');
       }
+      delete actionKeys.current.tiebreakers;
   
       const result = await response.json();
       console.log('Tiebreaker matches created:', result.tiebreakers);
-      setMatches(result.tiebreakers); // Set the matches to the tiebreakers
-      setIsTiebreaker(true); // Set the tiebreaker state to true
-      setHasPlayer3(result.tiebreakers.some(match => match.player3 !== null));  
+      showTiebreakers(result.tiebreakers);
     } catch (error) {
       console.error('Error creating tiebreaker matches:', error);
     }
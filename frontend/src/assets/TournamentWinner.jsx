@@ -23,6 +23,11 @@ const TournamentWinner = () => {
     };
 
     fetchPlayerRankings();
+
+    // Refresh when results change at another board
+    const source = new EventSource(`/api/tournaments/${tournamentId}/events`);
+    ['match_updated', 'round_created', 'tournament_finished', 'resync'].forEach((type) => source.addEventListener(type, fetchPlayerRankings));
+    return () => source.close();
   }, [tournamentId]);
 
   return (
@@ -0,0 +1,146 @@
+import threading
+import time
+from sqlalchemy import and_, case, event, func, or_, select, union_all
+from sqlalchemy.orm import Session
+from models import db, Match, Player, Round, Tournament
+from player_stats import tournament_player_ids
+
+# Writes through this process invalidate right away; the TTL only covers results written by another worker,
+# and a tournament's matrix is also recomputed as soon as its version has moved on
+CACHE_TTL_SECONDS = 30
+
+# Every pair of players a match can have, three-player tiebreakers included
+PLAYER_PAIRS = (
+    (Match.player1_id, Match.player2_id),
+    (Match.player1_id, Match.player3_id),
+    (Match.player2_id, Match.player3_id),
+)
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def pair_records(condition):
+    # (low_id, high_id, played, low_ahead, high_ahead) for every pair of players that met in a decided
+    # match satisfying condition(first, second), in one grouped query. A player is ahead of the other
+    # when they won, or came second behind a third player
+    branches = [
+        select(
+            case((first < second, first), else_=second).label('low_id'),
+            case((first < second, second), else_=first).label('high_id'),
+            Match.winner_id,
+            Match.second_place_id
+        ).where(first.isnot(None), second.isnot(None), Match.winner_id.isnot(None), condition(first, second))
+        for first, second in PLAYER_PAIRS
+    ]
+    pairs = union_all(*branches).subquery()
+    low_ahead = or_(pairs.c.winner_id == pairs.c.low_id, and_(pairs.c.second_place_id == pairs.c.low_id, pairs.c.winner_id != pairs.c.high_id))
+    high_ahead = or_(pairs.c.winner_id == pairs.c.high_id, and_(pairs.c.second_place_id == pairs.c.high_id, pairs.c.winner_id != pairs.c.low_id))
+    return db.session.execute(
+        select(
+            pairs.c.low_id,
+            pairs.c.high_id,
+            func.count(),
+            func.sum(case((low_ahead, 1), else_=0)),
+            func.sum(case((high_ahead, 1), else_=0))
+        ).group_by(pairs.c.low_id, pairs.c.high_id)
+    ).all()
+
+
+def compute_player_head_to_head(player_id):
+    opponents = []
+    for low_id, high_id, played, low_ahead, high_ahead in pair_records(lambda first, second: or_(first == player_id, second == player_id)):
+        if low_id == player_id:
+            opponents.append([high_id, played, int(low_ahead), int(high_ahead)])
+        else:
+            opponents.append([low_id, played, int(high_ahead), int(low_ahead)])
+
+    names = dict(db.session.query(Player.player_id, Player.name).filter(Player.player_id.in_([o[0] for o in opponents])).all()) if opponents else {}
+    opponents.sort(key=lambda o: (-o[1], o[0]))
+    return {
+        "player_id": player_id,
+        "opponents": [{
+            "opponent_id": opponent_id,
+            "name": names.get(opponent_id),
+            "played": played,
+            "wins": wins,
+            "losses": losses
+        } for opponent_id, played, wins, losses in opponents]
+    }
+
+
+def compute_tournament_matrix(tournament_id):
+    # Compact payload for the whole roster: parallel players/names lists and two square matrices
+    # indexed like them. played[i][j] counts the decided matches of i and j, wins[i][j] how often i
+    # finished ahead of j. Group matches of older tournaments only know theirs through the round
+    player_ids = sorted(tournament_player_ids(tournament_id))
+    index = {player_id: i for i, player_id in enumerate(player_ids)}
+    played = [[0] * len(player_ids) for _ in player_ids]
+    wins = [[0] * len(player_ids) for _ in player_ids]
+    for low_id, high_id, count, low_ahead, high_ahead in pair_records(
+        lambda first, second: Match.round_id.in_(select(Round.round_id).where(Round.tournament_id == tournament_id))
+    ):
+        low, high = index[low_id], index[high_id]
+        played[low][high] = played[high][low] = count
+        wins[low][high] = int(low_ahead)
+        wins[high][low] = int(high_ahead)
+
+    names = dict(db.session.query(Player.player_id, Player.name).filter(Player.player_id.in_(player_ids)).all()) if player_ids else {}
+    return {
+        "tournament_id": tournament_id,
+        "players": player_ids,
+        "names": [names.get(player_id) for player_id in player_ids],
+        "played": played,
+        "wins": wins
+    }
+
+
+def cached(key, compute, version=None):
+    # With a version, an entry computed at another one is stale whatever its age
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[2] > now and entry[1] == version:
+        return entry[0]
+    value = compute(key[1])
+    with _cache_lock:
+        _cache[key] = (value, version, now + CACHE_TTL_SECONDS)
+    return value
+
+
+def get_player_head_to_head(player_id):
+    return cached(('player', player_id), compute_player_head_to_head)
+
+
+def get_tournament_matrix(tournament_id, current_version=None):
+    return cached(('tournament', tournament_id), compute_tournament_matrix, current_version)
+
+
+def invalidate_head_to_head(keys=None):
+    with _cache_lock:
+        for key in keys if keys is not None else list(_cache):
+            _cache.pop(key, None)
+
+
+# Remember whose records a transaction changed and drop them from the cache once it commits
+@event.listens_for(Session, 'after_flush')
+def _collect_head_to_head_changes(session, flush_context):
+    changed = session.info.setdefault('changed_head_to_head', set())
+    for instance in list(session.dirty) + list(session.deleted):
+        if isinstance(instance, Match):
+            changed.add(('tournament', instance.tournament_id))
+            changed.update(('player', player_id) for player_id in (instance.player1_id, instance.player2_id, instance.player3_id) if player_id is not None)
+        elif isinstance(instance, Tournament):
+            changed.add(('tournament', instance.tournament_id))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_head_to_head(session):
+    changed = session.info.pop('changed_head_to_head', None)
+    if changed:
+        invalidate_head_to_head(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_head_to_head_changes(session):
+    session.info.pop('changed_head_to_head', None)
@@ -0,0 +1,86 @@
+import hashlib
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, jsonify, make_response, request
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from models import db, IdempotencyKey
+
+MAX_KEY_LENGTH = 100
+# Long enough for any client retry; older keys may be reused and are removed by purge_idempotency_keys.py
+KEY_TTL = timedelta(hours=24)
+# A claim whose response is still missing after this long belongs to a worker that died after committing
+PENDING_TIMEOUT = timedelta(minutes=1)
+
+
+def request_fingerprint():
+    return hashlib.sha256(b'\n'.join((request.method.encode(), request.path.encode(), request.get_data()))).hexdigest()
+
+
+def replay(entry, fingerprint):
+    if entry.fingerprint != fingerprint:
+        return jsonify({"error": "Idempotency-Key was already used for a different request"}), 422
+    if entry.status_code is None:
+        if entry.created_at < datetime.utcnow() - PENDING_TIMEOUT:
+            return jsonify({"error": "A request with this Idempotency-Key was processed, but its response was lost"}), 409
+        response = make_response(jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409)
+        response.headers['Retry-After'] = '1'
+        return response
+    response = Response(entry.response_body, status=entry.status_code, mimetype='application/json')
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(view):
+    # POST requests may carry an Idempotency-Key header. The key is claimed with an INSERT in the
+    # view's own transaction, so it is committed together with the view's writes or not at all. A
+    # retry of a request that went through gets the stored response instead of running the view
+    # again; a concurrent duplicate waits on the key's primary key and then does the same. Error
+    # responses are not stored, the request may be retried with the same key
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if request.method != 'POST' or not key:
+            return view(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return jsonify({"error": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"}), 400
+
+        fingerprint = request_fingerprint()
+        entry = db.session.get(IdempotencyKey, key)
+        if entry is not None and entry.created_at >= datetime.utcnow() - KEY_TTL:
+            return replay(entry, fingerprint)
+        try:
+            if entry is not None:
+                db.session.delete(entry)
+            db.session.add(IdempotencyKey(key=key, fingerprint=fingerprint, created_at=datetime.utcnow()))
+            db.session.flush()
+        except IntegrityError:
+            # Another worker claimed the key first and has committed since, or failed and let go of it
+            db.session.rollback()
+            entry = db.session.get(IdempotencyKey, key)
+            if entry is None:
+                return jsonify({"error": "A request with this Idempotency-Key failed, it may be retried"}), 409
+            return replay(entry, fingerprint)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code >= 400:
+            # Drops the claim along with whatever the failed view left uncommitted, or, if the view
+            # committed before failing, removes it so the key can be retried
+            db.session.rollback()
+            db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == key, IdempotencyKey.status_code.is_(None)))
+            db.session.commit()
+            return response
+
+        db.session.execute(
+            update(IdempotencyKey)
+            .where(IdempotencyKey.key == key)
+            .values(status_code=response.status_code, response_body=response.get_data(as_text=True))
+        )
+        db.session.commit()
+        return response
+    return wrapper
+
+
+def purge_idempotency_keys():
+    result = db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.created_at < datetime.utcnow() - KEY_TTL))
+    return result.rowcount
@@ -0,0 +1,130 @@
+from collections import defaultdict
+from sqlalchemy import insert, or_
+from models import db, BracketSlot, KnockoutPlayer, Match, Round, Tournament
+from pairing import knockout_standing
+from standings import GROUP_STAGE_ROUND_NUMBER
+
+# Knockout state per player: losses so far, the bracket they play in and whether they are out. The rows
+# are added when the knockout starts and kept in step with the results, so the next round reads the
+# field still in with one indexed query rather than from the match history
+
+NO_GROUP_STAGE = '1'
+
+
+def is_knockout_round(group_stage_format_id, round_number):
+    # Tiebreakers have no group either, but are played in the group-stage round
+    return str(group_stage_format_id) == NO_GROUP_STAGE or round_number != GROUP_STAGE_ROUND_NUMBER
+
+
+def match_loser(player1_id, player2_id, winner_id):
+    if winner_id is None:
+        return None
+    return player2_id if winner_id == player1_id else player1_id
+
+
+def add_knockout_players(tournament_id, player_ids):
+    # Entrants of a knockout that is starting, in the caller's transaction
+    rows = [{"tournament_id": tournament_id, "player_id": player_id} for player_id in dict.fromkeys(player_ids)]
+    if rows:
+        db.session.execute(insert(KnockoutPlayer), rows)
+
+
+def knockout_results():
+    # (tournament_id, group-stage format, knockout format, round number, player1_id, player2_id, winner_id,
+    # slot_id, loser_to_slot_id) of the matches outside the groups, tiebreakers included
+    return db.session.query(
+        Round.tournament_id, Tournament.group_stage_format_id, Tournament.knock_out_stage_format_id, Round.round_number,
+        Match.player1_id, Match.player2_id, Match.winner_id, BracketSlot.slot_id, BracketSlot.loser_to_slot_id
+    ).join(Round, Round.round_id == Match.round_id).join(Tournament, Tournament.tournament_id == Round.tournament_id).outerjoin(
+        BracketSlot, BracketSlot.match_id == Match.match_id
+    ).filter(Match.group_id.is_(None))
+
+
+def count_knockout_losses(players, results):
+    # Adds the knockout matches among results to players, (tournament_id, player_id) -> [format_id,
+    # losses, knocked out]. The loser of a bracket match whose loser drops nowhere is out whatever
+    # their losses: every match in single elimination, the losers bracket and the grand final in double
+    for tid, group_stage_format_id, format_id, round_number, player1_id, player2_id, winner_id, slot_id, loser_to_slot_id in results:
+        if not is_knockout_round(group_stage_format_id, round_number):
+            continue
+        for player_id in (player1_id, player2_id):
+            if player_id is not None:
+                players.setdefault((tid, player_id), [int(format_id or 0), 0, False])
+        loser_id = match_loser(player1_id, player2_id, winner_id)
+        if loser_id is not None:
+            player = players[(tid, loser_id)]
+            player[1] += 1
+            player[2] = player[2] or (slot_id is not None and loser_to_slot_id is None)
+    return players
+
+
+def record_knockout_results(changed_matches):
+    # Counterpart of standings.record_results for the knockout state. The players of a new or corrected
+    # result have their losses recounted from their knockout matches, so that a correction can't undo
+    # an elimination another match decided. One query for the matches and one for the rows per tournament
+    involved = defaultdict(set)  # tournament_id -> player_ids
+    formats = {}
+    for match, previous_winner_id, _ in changed_matches:
+        if match.group_id is not None or match.winner_id == previous_winner_id:
+            continue
+        match_round = db.session.get(Round, match.round_id)
+        tournament = db.session.get(Tournament, match_round.tournament_id)
+        if not is_knockout_round(tournament.group_stage_format_id, match_round.round_number):
+            continue
+        formats[tournament.tournament_id] = int(tournament.knock_out_stage_format_id or 0)
+        involved[tournament.tournament_id].update(player_id for player_id in (match.player1_id, match.player2_id) if player_id is not None)
+
+    for tournament_id, player_ids in involved.items():
+        players = count_knockout_losses({}, knockout_results().filter(
+            Round.tournament_id == tournament_id,
+            or_(Match.player1_id.in_(player_ids), Match.player2_id.in_(player_ids))
+        ))
+        rows = KnockoutPlayer.query.filter(KnockoutPlayer.tournament_id == tournament_id, KnockoutPlayer.player_id.in_(player_ids))
+        for row in rows:
+            _, row.losses, knocked_out = players.get((tournament_id, row.player_id), (None, 0, False))
+            row.bracket, row.eliminated = knockout_standing(formats[tournament_id], row.losses)
+            row.eliminated = row.eliminated or knocked_out
+
+
+def active_knockout_players(tournament_id):
+    # [(player_id, bracket)] of the players still in, for pairing.elimination_pairings
+    return db.session.query(KnockoutPlayer.player_id, KnockoutPlayer.bracket).filter_by(
+        tournament_id=tournament_id, eliminated=False
+    ).order_by(KnockoutPlayer.bracket, KnockoutPlayer.player_id).all()
+
+
+def rebuild_knockout_players(tournament_id=None):
+    # Recreate the rows from the knockout matches played, for one tournament or all of them
+    delete_query = KnockoutPlayer.query
+    results_query = knockout_results().order_by(Round.tournament_id, Match.match_id)
+    # Bracket entrants waiting out a bye have no match yet
+    entrants_query = db.session.query(
+        BracketSlot.tournament_id, Tournament.knock_out_stage_format_id, BracketSlot.player1_id, BracketSlot.player2_id
+    ).join(Tournament, Tournament.tournament_id == BracketSlot.tournament_id)
+    if tournament_id is not None:
+        delete_query = delete_query.filter_by(tournament_id=tournament_id)
+        results_query = results_query.filter(Round.tournament_id == tournament_id)
+        entrants_query = entrants_query.filter(BracketSlot.tournament_id == tournament_id)
+
+    players = {}  # (tournament_id, player_id) -> [format_id, losses, knocked out]
+    for tid, format_id, player1_id, player2_id in entrants_query:
+        for player_id in (player1_id, player2_id):
+            if player_id is not None:
+                players.setdefault((tid, player_id), [int(format_id or 0), 0, False])
+    count_knockout_losses(players, results_query)
+
+    rows = []
+    for (tid, player_id), (format_id, losses, knocked_out) in players.items():
+        bracket, eliminated = knockout_standing(format_id, losses)
+        rows.append({
+            "tournament_id": tid,
+            "player_id": player_id,
+            "losses": losses,
+            "bracket": bracket,
+            "eliminated": eliminated or knocked_out
+        })
+
+    delete_query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(KnockoutPlayer), rows)
+    return len(rows)
@@ -0,0 +1,87 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+# Records go through a queue and are encoded and written by a listener thread, so a request only pays
+# for the level check and, when the record is emitted, merging its arguments into the message.
+#
+# LOG_LEVEL sets the default level, LOG_LEVELS per-module ones, e.g. "tournament=DEBUG,metrics=ERROR".
+# LOG_FORMAT=text gives plain lines instead of JSON
+
+# Attributes every LogRecord has; anything else came in through extra= and is logged as a field
+STANDARD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in STANDARD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = {key: value for key, value in vars(record).items() if key not in STANDARD_ATTRIBUTES}
+        if fields:
+            line += ' ' + ' '.join(f'{key}={value}' for key, value in fields.items())
+        return line
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The stock handler runs the whole formatter here, on the logging thread. Only resolve what
+        # can't travel safely to the listener: the message arguments and the traceback
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(value):
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        name, _, level = item.partition('=')
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging():
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(TextFormatter() if os.environ.get('LOG_FORMAT') == 'text' else JsonFormatter())
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(records)]
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    for name, level in parse_levels(os.environ.get('LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import threading
+import time
+from flask import jsonify, make_response, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from models import Player, GroupStageFormat, KnockOutStageFormat
+
+
+def load_players():
+    return [{'player_id': player.player_id, 'name': player.name} for player in Player.query.order_by(Player.player_id)]
+
+
+def load_formats(model):
+    return lambda: [{'format_id': fmt.format_id, 'format_name': fmt.format_name} for fmt in model.query.order_by(model.format_id)]
+
+
+# name -> (model, loader, seconds a loaded table is trusted, Cache-Control header)
+# Writes through this process invalidate right away; the TTL only covers writes made by another
+# worker process. The formats are seeded once by populate_formats.py and never expire
+LOOKUPS = {
+    'players': (Player, load_players, 30, 'no-cache'),
+    'group_stage_formats': (GroupStageFormat, load_formats(GroupStageFormat), None, 'public, max-age=3600'),
+    'knock_out_stage_formats': (KnockOutStageFormat, load_formats(KnockOutStageFormat), None, 'public, max-age=3600'),
+}
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_lookup(name):
+    # Returns (rows, etag), loading the table only when it is not cached or has expired
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(name)
+    if entry is not None:
+        rows, etag, expires_at = entry
+        if expires_at is None or expires_at > now:
+            return rows, etag
+
+    _, loader, ttl, _ = LOOKUPS[name]
+    rows = loader()
+    etag = hashlib.sha1(json.dumps(rows, sort_keys=True).encode()).hexdigest()[:16]
+    with _cache_lock:
+        _cache[name] = (rows, etag, None if ttl is None else now + ttl)
+    return rows, etag
+
+
+def lookup_response(name):
+    rows, etag = get_lookup(name)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(jsonify(rows))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = LOOKUPS[name][3]
+    return response
+
+
+def invalidate_lookups(*names):
+    with _cache_lock:
+        for name in names or list(_cache):
+            _cache.pop(name, None)
+
+
+# Remember which lookup tables a transaction wrote to and drop them from the cache once it commits
+@event.listens_for(Session, 'after_flush')
+def _collect_lookup_changes(session, flush_context):
+    changed = session.info.setdefault('changed_lookups', set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        for name, (model, _, _, _) in LOOKUPS.items():
+            if isinstance(instance, model):
+                changed.add(name)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_lookups(session):
+    changed = session.info.pop('changed_lookups', None)
+    if changed:
+        invalidate_lookups(*changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_lookup_changes(session):
+    session.info.pop('changed_lookups', None)
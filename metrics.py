@@ -0,0 +1,153 @@
+import logging
+import os
+import threading
+from contextvars import ContextVar
+import time
+from bisect import bisect_left
+from flask import Response, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+# Statements slower than this are logged with the endpoint that ran them
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_MS', '100')) / 1000
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_sum{{{labels}}} {self.sum}'
+        yield f'{name}_count{{{labels}}} {cumulative}'
+
+
+class RequestMetrics:
+    # Per-process totals; with several workers every process reports its own series
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.latency = {}  # (endpoint, method) -> Histogram
+        self.queries = {}  # (endpoint, method) -> Histogram
+        self.sql_seconds = {}  # (endpoint, method) -> float
+        self.slow_queries = {}  # endpoint -> count
+
+    def record_request(self, endpoint, method, status, seconds, num_queries, sql_seconds):
+        key = (endpoint, method)
+        with self._lock:
+            self.requests[key + (status,)] = self.requests.get(key + (status,), 0) + 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(LATENCY_BUCKETS)
+                self.queries[key] = Histogram(QUERY_COUNT_BUCKETS)
+            self.latency[key].observe(seconds)
+            self.queries[key].observe(num_queries)
+            self.sql_seconds[key] = self.sql_seconds.get(key, 0) + sql_seconds
+
+    def record_slow_query(self, endpoint):
+        with self._lock:
+            self.slow_queries[endpoint] = self.slow_queries.get(endpoint, 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append('# HELP darts_http_requests_total Requests handled, by endpoint, method and status')
+            lines.append('# TYPE darts_http_requests_total counter')
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'darts_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            lines.append('# HELP darts_http_request_duration_seconds Time spent in the view, until the response is returned')
+            lines.append('# TYPE darts_http_request_duration_seconds histogram')
+            for (endpoint, method), histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines('darts_http_request_duration_seconds', f'endpoint="{endpoint}",method="{method}"'))
+
+            lines.append('# HELP darts_sql_statements_per_request SQL statements executed per request')
+            lines.append('# TYPE darts_sql_statements_per_request histogram')
+            for (endpoint, method), histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines('darts_sql_statements_per_request', f'endpoint="{endpoint}",method="{method}"'))
+
+            lines.append('# HELP darts_sql_duration_seconds_total Time spent executing SQL statements')
+            lines.append('# TYPE darts_sql_duration_seconds_total counter')
+            for (endpoint, method), seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'darts_sql_duration_seconds_total{{endpoint="{endpoint}",method="{method}"}} {seconds}')
+
+            lines.append(f'# HELP darts_sql_slow_statements_total Statements slower than {SLOW_QUERY_SECONDS} seconds')
+            lines.append('# TYPE darts_sql_slow_statements_total counter')
+            for endpoint, count in sorted(self.slow_queries.items()):
+                lines.append(f'darts_sql_slow_statements_total{{endpoint="{endpoint}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = RequestMetrics()
+
+# [statements, seconds, start time] of the request being handled; a context variable is cheaper per statement than flask.g
+_request_sql = ContextVar('request_sql', default=None)
+# Endpoint of a request served outside Flask, by the async views of asgi.py
+_request_endpoint = ContextVar('request_endpoint', default=None)
+
+
+def current_endpoint():
+    # Unknown URLs share one label so 404 scans can't grow the series without bound
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return _request_endpoint.get() or 'none'
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_statement(conn, cursor, statement, parameters, context, executemany):
+    context.statement_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _finish_statement(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.statement_start
+    request_sql = _request_sql.get()
+    if request_sql is not None:
+        request_sql[0] += 1
+        request_sql[1] += elapsed
+    if elapsed >= SLOW_QUERY_SECONDS:
+        endpoint = current_endpoint()
+        metrics.record_slow_query(endpoint)
+        log.warning("Slow query", extra={"duration_ms": round(elapsed * 1000, 1), "endpoint": endpoint, "statement": statement[:500]})
+
+
+def start_request(endpoint=None):
+    _request_endpoint.set(endpoint)
+    _request_sql.set([0, 0.0, time.perf_counter()])
+
+
+def finish_request(endpoint, method, status):
+    request_sql = _request_sql.get()
+    if request_sql is not None:
+        statements, sql_seconds, start = request_sql
+        metrics.record_request(endpoint, method, status, time.perf_counter() - start, statements, sql_seconds)
+        _request_sql.set(None)
+    _request_endpoint.set(None)
+
+
+def init_metrics(app):
+    @app.before_request
+    def start_request_metrics():
+        start_request()
+
+    @app.after_request
+    def record_request_metrics(response):
+        finish_request(current_endpoint(), request.method, response.status_code)
+        return response
+
+    @app.route('/api/_metrics', methods=['GET'])
+    def get_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,43 @@
+"""Add normalized player names
+
+Revision ID: 3b1f5c7d9e20
+Revises: ce7842198087
+Create Date: 2026-10-18 14:05:12.318402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from models import normalize_name
+
+
+# revision identifiers, used by Alembic.
+revision = '3b1f5c7d9e20'
+down_revision = 'ce7842198087'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('players', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('name_normalized', sa.String(length=80), nullable=True))
+
+    # Accent stripping has no portable SQL equivalent, so the existing names are normalized here
+    connection = op.get_bind()
+    players = sa.table('players', sa.column('player_id', sa.Integer), sa.column('name', sa.String), sa.column('name_normalized', sa.String))
+    rows = [{"b_player_id": player_id, "b_name_normalized": normalize_name(name)}
+            for player_id, name in connection.execute(sa.select(players.c.player_id, players.c.name))]
+    if rows:
+        connection.execute(
+            players.update().where(players.c.player_id == sa.bindparam('b_player_id')).values(name_normalized=sa.bindparam('b_name_normalized')),
+            rows
+        )
+
+    with op.batch_alter_table('players', schema=None) as batch_op:
+        batch_op.alter_column('name_normalized', existing_type=sa.String(length=80), nullable=False)
+        batch_op.create_index('ix_players_name_normalized_player_id', ['name_normalized', 'player_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('players', schema=None) as batch_op:
+        batch_op.drop_index('ix_players_name_normalized_player_id')
+        batch_op.drop_column('name_normalized')
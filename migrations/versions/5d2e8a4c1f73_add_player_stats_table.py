@@ -0,0 +1,35 @@
+"""Add player_stats table
+
+Revision ID: 5d2e8a4c1f73
+Revises: 3b1f5c7d9e20
+Create Date: 2026-10-18 14:41:53.207615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8a4c1f73'
+down_revision = '3b1f5c7d9e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing players get their rows from rebuild_player_stats.py after upgrading
+    op.create_table('player_stats',
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('matches_played', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('matches_won', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('second_places', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('tournaments_entered', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('best_finish', sa.Integer(), nullable=True),
+    sa.Column('recent_form', sa.String(length=10), server_default='', nullable=False),
+    sa.ForeignKeyConstraint(['player_id'], ['players.player_id'], name=op.f('fk_player_stats_player_id_players')),
+    sa.PrimaryKeyConstraint('player_id')
+    )
+
+
+def downgrade():
+    op.drop_table('player_stats')
@@ -0,0 +1,53 @@
+"""Add player_ratings and rating_changes tables
+
+Revision ID: 8c4a1e6b2d95
+Revises: 5d2e8a4c1f73
+Create Date: 2026-10-18 15:20:36.918244
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c4a1e6b2d95'
+down_revision = '5d2e8a4c1f73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing results are rated by recompute_ratings.py after upgrading
+    op.create_table('player_ratings',
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('rating', sa.Float(), nullable=False),
+    sa.Column('rated_matches', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['player_id'], ['players.player_id'], name=op.f('fk_player_ratings_player_id_players')),
+    sa.PrimaryKeyConstraint('player_id')
+    )
+    with op.batch_alter_table('player_ratings', schema=None) as batch_op:
+        batch_op.create_index('ix_player_ratings_rating', ['rating'], unique=False)
+
+    op.create_table('rating_changes',
+    sa.Column('match_id', sa.Integer(), nullable=False),
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('sequence', sa.Integer(), nullable=False),
+    sa.Column('rating_before', sa.Float(), nullable=False),
+    sa.Column('rating_after', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['match_id'], ['matches.match_id'], name=op.f('fk_rating_changes_match_id_matches')),
+    sa.ForeignKeyConstraint(['player_id'], ['players.player_id'], name=op.f('fk_rating_changes_player_id_players')),
+    sa.PrimaryKeyConstraint('match_id', 'player_id')
+    )
+    with op.batch_alter_table('rating_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_rating_changes_sequence', ['sequence'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('rating_changes', schema=None) as batch_op:
+        batch_op.drop_index('ix_rating_changes_sequence')
+
+    op.drop_table('rating_changes')
+    with op.batch_alter_table('player_ratings', schema=None) as batch_op:
+        batch_op.drop_index('ix_player_ratings_rating')
+
+    op.drop_table('player_ratings')
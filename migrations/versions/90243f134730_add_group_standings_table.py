@@ -0,0 +1,45 @@
+"""Add group_standings table
+
+Revision ID: 90243f134730
+Revises: a78c3ed3821e
+Create Date: 2026-10-18 11:02:17.540921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '90243f134730'
+down_revision = 'a78c3ed3821e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing tournaments get their rows from rebuild_standings.py after upgrading
+    op.create_table('group_standings',
+    sa.Column('group_player_id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('group_id', sa.Integer(), nullable=False),
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('points', sa.Float(), server_default='0', nullable=False),
+    sa.Column('played', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('won', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['group_id'], ['groups.group_id'], name=op.f('fk_group_standings_group_id_groups')),
+    sa.ForeignKeyConstraint(['group_player_id'], ['group_players.group_player_id'], name=op.f('fk_group_standings_group_player_id_group_players')),
+    sa.ForeignKeyConstraint(['player_id'], ['players.player_id'], name=op.f('fk_group_standings_player_id_players')),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.tournament_id'], name=op.f('fk_group_standings_tournament_id_tournaments')),
+    sa.PrimaryKeyConstraint('group_player_id')
+    )
+    with op.batch_alter_table('group_standings', schema=None) as batch_op:
+        batch_op.create_index('ix_group_standings_tournament_id_group_id_points', ['tournament_id', 'group_id', 'points'], unique=False)
+        batch_op.create_index('ix_group_standings_tournament_id_player_id', ['tournament_id', 'player_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('group_standings', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_standings_tournament_id_player_id')
+        batch_op.drop_index('ix_group_standings_tournament_id_group_id_points')
+
+    op.drop_table('group_standings')
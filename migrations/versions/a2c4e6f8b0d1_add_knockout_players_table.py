@@ -0,0 +1,41 @@
+"""Add knockout_players table
+
+Revision ID: a2c4e6f8b0d1
+Revises: f1c3d5e7a9b2
+Create Date: 2026-10-18 18:02:47.615203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a2c4e6f8b0d1'
+down_revision = 'f1c3d5e7a9b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Knockouts under way get their rows from rebuild_knockout_players.py, or on their next round
+    op.create_table('knockout_players',
+    sa.Column('knockout_player_id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('player_id', sa.Integer(), nullable=False),
+    sa.Column('losses', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('bracket', sa.String(length=1), server_default='W', nullable=False),
+    sa.Column('eliminated', sa.Boolean(), server_default=sa.false(), nullable=False),
+    sa.ForeignKeyConstraint(['player_id'], ['players.player_id'], name=op.f('fk_knockout_players_player_id_players')),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.tournament_id'], name=op.f('fk_knockout_players_tournament_id_tournaments')),
+    sa.PrimaryKeyConstraint('knockout_player_id'),
+    sa.UniqueConstraint('tournament_id', 'player_id', name='uq_knockout_players_tournament_id_player_id')
+    )
+    with op.batch_alter_table('knockout_players', schema=None) as batch_op:
+        batch_op.create_index('ix_knockout_players_tournament_id_eliminated_bracket_player_id', ['tournament_id', 'eliminated', 'bracket', 'player_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('knockout_players', schema=None) as batch_op:
+        batch_op.drop_index('ix_knockout_players_tournament_id_eliminated_bracket_player_id')
+
+    op.drop_table('knockout_players')
@@ -0,0 +1,58 @@
+"""Add indexes for hot lookup columns
+
+Revision ID: a78c3ed3821e
+Revises: 4865d8f39f6f
+Create Date: 2026-10-18 10:12:44.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a78c3ed3821e'
+down_revision = '4865d8f39f6f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Every round lookup filters on (tournament_id, round_number); a tournament can only
+    # have one round per number, so this doubles as the lookup index.
+    # Remove duplicate rounds before upgrading a database that already contains them.
+    with op.batch_alter_table('rounds', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_rounds_tournament_id_round_number', ['tournament_id', 'round_number'])
+
+    with op.batch_alter_table('matches', schema=None) as batch_op:
+        batch_op.create_index('ix_matches_round_id_winner_id', ['round_id', 'winner_id'], unique=False)
+        batch_op.create_index('ix_matches_winner_id_round_id', ['winner_id', 'round_id'], unique=False)
+
+    with op.batch_alter_table('group_players', schema=None) as batch_op:
+        batch_op.create_index('ix_group_players_group_id_player_id', ['group_id', 'player_id'], unique=False)
+
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.create_index('ix_groups_tournament_id_group_number', ['tournament_id', 'group_number'], unique=False)
+
+
+def downgrade():
+    # MySQL silently drops its implicit foreign key indexes once a composite index covers
+    # the column, so put single-column ones back before the composites can be removed
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ix_groups_tournament_id', 'groups', ['tournament_id'], unique=False)
+        op.create_index('ix_group_players_group_id', 'group_players', ['group_id'], unique=False)
+        op.create_index('ix_matches_round_id', 'matches', ['round_id'], unique=False)
+        op.create_index('ix_matches_winner_id', 'matches', ['winner_id'], unique=False)
+        op.create_index('ix_rounds_tournament_id', 'rounds', ['tournament_id'], unique=False)
+
+    with op.batch_alter_table('groups', schema=None) as batch_op:
+        batch_op.drop_index('ix_groups_tournament_id_group_number')
+
+    with op.batch_alter_table('group_players', schema=None) as batch_op:
+        batch_op.drop_index('ix_group_players_group_id_player_id')
+
+    with op.batch_alter_table('matches', schema=None) as batch_op:
+        batch_op.drop_index('ix_matches_winner_id_round_id')
+        batch_op.drop_index('ix_matches_round_id_winner_id')
+
+    with op.batch_alter_table('rounds', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_rounds_tournament_id_round_number', type_='unique')
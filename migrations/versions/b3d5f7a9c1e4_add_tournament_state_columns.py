@@ -0,0 +1,88 @@
+"""Add current round, phase and match counters to tournaments
+
+Revision ID: b3d5f7a9c1e4
+Revises: a2c4e6f8b0d1
+Create Date: 2026-10-18 18:41:30.027914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3d5f7a9c1e4'
+down_revision = 'a2c4e6f8b0d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tournaments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('current_round_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('phase', sa.Enum('group', 'tiebreak', 'knockout', 'finished', name='tournament_phase'), server_default='group', nullable=False))
+        batch_op.add_column(sa.Column('matches_total', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('matches_played', sa.Integer(), server_default='0', nullable=False))
+        batch_op.create_foreign_key(batch_op.f('fk_tournaments_current_round_id_rounds'), 'rounds', ['current_round_id'], ['round_id'], ondelete='SET NULL')
+
+    # The state of existing tournaments, from their rounds and matches as rankings.is_finished reads them
+    connection = op.get_bind()
+    tournaments = sa.table('tournaments', sa.column('tournament_id', sa.Integer), sa.column('group_stage_format_id', sa.Integer),
+                           sa.column('current_round_id', sa.Integer), sa.column('phase', sa.String),
+                           sa.column('matches_total', sa.Integer), sa.column('matches_played', sa.Integer))
+    rounds = sa.table('rounds', sa.column('round_id', sa.Integer), sa.column('tournament_id', sa.Integer), sa.column('round_number', sa.Integer))
+    matches = sa.table('matches', sa.column('match_id', sa.Integer), sa.column('round_id', sa.Integer), sa.column('group_id', sa.Integer), sa.column('winner_id', sa.Integer))
+    slots = sa.table('bracket_slots', sa.column('slot_id', sa.Integer), sa.column('match_id', sa.Integer), sa.column('winner_id', sa.Integer),
+                     sa.column('winner_to_slot_id', sa.Integer))
+
+    latest = {}  # tournament_id -> (round_number, round_id)
+    for tournament_id, round_number, round_id in connection.execute(sa.select(rounds.c.tournament_id, rounds.c.round_number, rounds.c.round_id)):
+        latest[tournament_id] = max(latest.get(tournament_id, (0, None)), (round_number, round_id))
+    # Like bracket.feeds_next_slot: a grand final whose reset went to its winner as a bye feeds nothing
+    next_slots = slots.alias('next_slots')
+    feeding = set(connection.scalars(sa.select(slots.c.match_id).join(next_slots, next_slots.c.slot_id == slots.c.winner_to_slot_id).where(
+        slots.c.match_id.isnot(None), sa.or_(next_slots.c.match_id.isnot(None), next_slots.c.winner_id.is_(None))
+    )))
+    round_matches = {}  # round_id -> [(group_id, winner_id, feeds the bracket)]
+    counts = {}  # tournament_id -> [total, played]
+    for tournament_id, round_id, match_id, group_id, winner_id in connection.execute(
+        sa.select(rounds.c.tournament_id, matches.c.round_id, matches.c.match_id, matches.c.group_id, matches.c.winner_id)
+        .join(rounds, rounds.c.round_id == matches.c.round_id)
+    ):
+        round_matches.setdefault(round_id, []).append((group_id, winner_id, match_id in feeding))
+        count = counts.setdefault(tournament_id, [0, 0])
+        count[0] += 1
+        count[1] += winner_id is not None
+
+    rows = []
+    for tournament_id, group_stage_format_id in connection.execute(sa.select(tournaments.c.tournament_id, tournaments.c.group_stage_format_id)):
+        round_number, round_id = latest.get(tournament_id, (0, None))
+        last_round = round_matches.get(round_id, [])
+        if str(group_stage_format_id) != '1' and round_number <= 1:
+            phase = 'tiebreak' if any(group_id is None for group_id, _, _ in last_round) else 'group'
+        elif len(last_round) == 1 and last_round[0][0] is None and last_round[0][1] is not None and not last_round[0][2]:
+            phase = 'finished'
+        else:
+            phase = 'knockout'
+        total, played = counts.get(tournament_id, (0, 0))
+        rows.append({"b_tournament_id": tournament_id, "b_current_round_id": round_id, "b_phase": phase, "b_matches_total": total, "b_matches_played": played})
+    if rows:
+        connection.execute(
+            tournaments.update().where(tournaments.c.tournament_id == sa.bindparam('b_tournament_id')).values(
+                current_round_id=sa.bindparam('b_current_round_id'),
+                phase=sa.bindparam('b_phase'),
+                matches_total=sa.bindparam('b_matches_total'),
+                matches_played=sa.bindparam('b_matches_played')
+            ),
+            rows
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('tournaments', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_tournaments_current_round_id_rounds'), type_='foreignkey')
+        batch_op.drop_column('matches_played')
+        batch_op.drop_column('matches_total')
+        batch_op.drop_column('phase')
+        batch_op.drop_column('current_round_id')
+
+    sa.Enum(name='tournament_phase').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,32 @@
+"""Backfill the tournament of group matches from their round
+
+Revision ID: c4e6a8b0d2f3
+Revises: b3d5f7a9c1e4
+Create Date: 2026-10-18 21:12:46.580371
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e6a8b0d2f3'
+down_revision = 'b3d5f7a9c1e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Group matches used to be created without a tournament_id; their round has it
+    matches = sa.table('matches', sa.column('round_id', sa.Integer), sa.column('tournament_id', sa.Integer))
+    rounds = sa.table('rounds', sa.column('round_id', sa.Integer), sa.column('tournament_id', sa.Integer))
+    op.execute(
+        matches.update().where(matches.c.tournament_id.is_(None)).values(
+            tournament_id=sa.select(rounds.c.tournament_id).where(rounds.c.round_id == matches.c.round_id).scalar_subquery()
+        )
+    )
+
+
+def downgrade():
+    # The backfilled ids are the right ones either way
+    pass
@@ -0,0 +1,26 @@
+"""Add version to tournaments
+
+Revision ID: ce7842198087
+Revises: 90243f134730
+Create Date: 2026-10-18 12:20:41.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ce7842198087'
+down_revision = '90243f134730'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tournaments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('tournaments', schema=None) as batch_op:
+        batch_op.drop_column('version')
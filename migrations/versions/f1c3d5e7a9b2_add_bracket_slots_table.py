@@ -0,0 +1,56 @@
+"""Add bracket_slots table
+
+Revision ID: f1c3d5e7a9b2
+Revises: e4b7a2c9d013
+Create Date: 2026-10-18 17:24:09.381542
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c3d5e7a9b2'
+down_revision = 'e4b7a2c9d013'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Knockouts already under way keep pairing the winners of their previous round
+    op.create_table('bracket_slots',
+    sa.Column('slot_id', sa.Integer(), nullable=False),
+    sa.Column('tournament_id', sa.Integer(), nullable=False),
+    sa.Column('bracket', sa.String(length=1), nullable=False),
+    sa.Column('bracket_round', sa.Integer(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('seed1', sa.Integer(), nullable=True),
+    sa.Column('seed2', sa.Integer(), nullable=True),
+    sa.Column('player1_id', sa.Integer(), nullable=True),
+    sa.Column('player2_id', sa.Integer(), nullable=True),
+    sa.Column('pending_entries', sa.Integer(), nullable=False),
+    sa.Column('winner_id', sa.Integer(), nullable=True),
+    sa.Column('winner_to_slot_id', sa.Integer(), nullable=True),
+    sa.Column('winner_to_position', sa.Integer(), nullable=True),
+    sa.Column('loser_to_slot_id', sa.Integer(), nullable=True),
+    sa.Column('loser_to_position', sa.Integer(), nullable=True),
+    sa.Column('match_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['loser_to_slot_id'], ['bracket_slots.slot_id'], name=op.f('fk_bracket_slots_loser_to_slot_id_bracket_slots')),
+    sa.ForeignKeyConstraint(['match_id'], ['matches.match_id'], name=op.f('fk_bracket_slots_match_id_matches')),
+    sa.ForeignKeyConstraint(['player1_id'], ['players.player_id'], name=op.f('fk_bracket_slots_player1_id_players')),
+    sa.ForeignKeyConstraint(['player2_id'], ['players.player_id'], name=op.f('fk_bracket_slots_player2_id_players')),
+    sa.ForeignKeyConstraint(['tournament_id'], ['tournaments.tournament_id'], name=op.f('fk_bracket_slots_tournament_id_tournaments')),
+    sa.ForeignKeyConstraint(['winner_id'], ['players.player_id'], name=op.f('fk_bracket_slots_winner_id_players')),
+    sa.ForeignKeyConstraint(['winner_to_slot_id'], ['bracket_slots.slot_id'], name=op.f('fk_bracket_slots_winner_to_slot_id_bracket_slots')),
+    sa.PrimaryKeyConstraint('slot_id'),
+    sa.UniqueConstraint('match_id', name=op.f('uq_bracket_slots_match_id'))
+    )
+    with op.batch_alter_table('bracket_slots', schema=None) as batch_op:
+        batch_op.create_index('ix_bracket_slots_tournament_id_match_id', ['tournament_id', 'match_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bracket_slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_bracket_slots_tournament_id_match_id')
+
+    op.drop_table('bracket_slots')
@@ -1,3 +1,4 @@
+import unicodedata
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import MetaData
 from sqlalchemy.orm import validates
@@ -12,11 +13,26 @@ metadata = MetaData(naming_convention={
 
 db = SQLAlchemy(metadata=metadata)
 
+def normalize_name(name):
+    # Search key for player names: case-folded, accents stripped, whitespace collapsed
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    return ' '.join(''.join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
 class Player(db.Model):
     __tablename__ = 'players'
+    __table_args__ = (
+        db.Index('ix_players_name_normalized_player_id', 'name_normalized', 'player_id'),
+    )
 
     player_id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
+    # Kept in step with name, backs the typeahead search and the name-ordered pages of /api/players
+    name_normalized = db.Column(db.String(80), nullable=False)
+
+    @validates('name')
+    def validate_name(self, key, name):
+        self.name_normalized = normalize_name(name)
+        return name
 
 class GroupStageFormat(db.Model):
     __tablename__ = 'group_stage_formats'
@@ -29,6 +45,13 @@ class KnockOutStageFormat(db.Model):
     format_name = db.Column(db.String(50), nullable=False)
 
 
+# Stages of a tournament, Tournament.phase
+PHASE_GROUP = 'group'
+PHASE_TIEBREAK = 'tiebreak'
+PHASE_KNOCKOUT = 'knockout'
+PHASE_FINISHED = 'finished'
+TOURNAMENT_PHASES = (PHASE_GROUP, PHASE_TIEBREAK, PHASE_KNOCKOUT, PHASE_FINISHED)
+
 class Tournament(db.Model):
     __tablename__ = 'tournaments'
 
@@ -38,34 +61,116 @@ class Tournament(db.Model):
     group_stage_format_id = db.Column(db.Integer, db.ForeignKey('group_stage_formats.format_id'), nullable=True)
     knock_out_stage_format_id = db.Column(db.Integer, db.ForeignKey('knock_out_stage_formats.format_id'), nullable=True)
     advancing_players = db.Column(db.Integer, nullable=True)
+    # Bumped by every write to the tournament, drives the ETags of its GET endpoints
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Where the tournament stands, kept in step by the writes in tournament.py so a request finds its
+    # context with the tournament's primary key
+    current_round_id = db.Column(db.Integer, db.ForeignKey('rounds.round_id', use_alter=True, ondelete='SET NULL'), nullable=True)
+    phase = db.Column(db.Enum(*TOURNAMENT_PHASES, name='tournament_phase'), nullable=False, default=PHASE_GROUP, server_default=PHASE_GROUP)
+    matches_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    matches_played = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     group_stage_format = db.relationship('GroupStageFormat', backref=db.backref('tournaments', lazy=True))
     knock_out_stage_format = db.relationship('KnockOutStageFormat', backref=db.backref('tournaments', lazy=True))
-    rounds = db.relationship('Round', backref='tournament', cascade='all, delete-orphan')
+    rounds = db.relationship('Round', backref='tournament', cascade='all, delete-orphan', foreign_keys='Round.tournament_id')
     groups = db.relationship('Group', backref='tournament', cascade='all, delete-orphan')
+    bracket_slots = db.relationship('BracketSlot', cascade='all, delete-orphan')
+    knockout_players = db.relationship('KnockoutPlayer', cascade='all, delete-orphan')
 
 class Group(db.Model):
     __tablename__ = 'groups'
+    __table_args__ = (
+        db.Index('ix_groups_tournament_id_group_number', 'tournament_id', 'group_number'),
+    )
 
     group_id = db.Column(db.Integer, primary_key=True)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'))
     group_number = db.Column(db.Integer, nullable=False, server_default = '1')
     group_name = db.Column(db.String(80), nullable=False)
 
-    players = db.relationship('GroupPlayer', backref='group', cascade='all, delete-orphan')
+    players = db.relationship('GroupPlayer', backref='group', cascade='all, delete-orphan', order_by='GroupPlayer.group_player_id')
     matches = db.relationship('Match', backref='group', cascade='all, delete-orphan') 
 
 class GroupPlayer(db.Model):
     __tablename__ = 'group_players'
+    __table_args__ = (
+        db.Index('ix_group_players_group_id_player_id', 'group_id', 'player_id'),
+    )
 
     group_player_id = db.Column(db.Integer, primary_key=True)
     group_id = db.Column(db.Integer, db.ForeignKey('groups.group_id'))
     player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'))
 
     player = db.relationship('Player', backref='group_entries')
+    standing = db.relationship('GroupStanding', backref='group_player', uselist=False, cascade='all, delete-orphan')
+
+# Running group-stage totals per group player, kept in step with match results by update_match
+class GroupStanding(db.Model):
+    __tablename__ = 'group_standings'
+    __table_args__ = (
+        db.Index('ix_group_standings_tournament_id_group_id_points', 'tournament_id', 'group_id', 'points'),
+        db.Index('ix_group_standings_tournament_id_player_id', 'tournament_id', 'player_id'),
+    )
+
+    group_player_id = db.Column(db.Integer, db.ForeignKey('group_players.group_player_id'), primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'), nullable=False)
+    group_id = db.Column(db.Integer, db.ForeignKey('groups.group_id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=False)
+    points = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    played = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    won = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    group = db.relationship('Group')
+    player = db.relationship('Player')
+
+# Career totals per player across all tournaments, kept in step with results by player_stats.py
+class PlayerStats(db.Model):
+    __tablename__ = 'player_stats'
+
+    player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), primary_key=True)
+    matches_played = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    matches_won = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    second_places = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tournaments_entered = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Best place in a finished tournament, 1 for a title; None until one has finished
+    best_finish = db.Column(db.Integer, nullable=True)
+    # Latest results first: W win, S second place, L loss
+    recent_form = db.Column(db.String(10), nullable=False, default='', server_default='')
+
+    player = db.relationship('Player', backref=db.backref('stats', uselist=False))
+
+# Current Elo-style rating per player, maintained by ratings.py
+class PlayerRating(db.Model):
+    __tablename__ = 'player_ratings'
+    __table_args__ = (
+        db.Index('ix_player_ratings_rating', 'rating'),
+    )
+
+    player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), primary_key=True)
+    rating = db.Column(db.Float, nullable=False)
+    rated_matches = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    player = db.relationship('Player', backref=db.backref('rating', uselist=False))
+
+# Rating log: one row per participant of every rated match. All rows of a match share its sequence
+# number, the order the results were rated in; a corrected result is replayed from there
+class RatingChange(db.Model):
+    __tablename__ = 'rating_changes'
+    __table_args__ = (
+        db.Index('ix_rating_changes_sequence', 'sequence'),
+    )
+
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.match_id'), primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), primary_key=True)
+    sequence = db.Column(db.Integer, nullable=False)
+    rating_before = db.Column(db.Float, nullable=False)
+    rating_after = db.Column(db.Float, nullable=False)
 
 class Round(db.Model):
     __tablename__ = 'rounds'
+    __table_args__ = (
+        db.UniqueConstraint('tournament_id', 'round_number', name='uq_rounds_tournament_id_round_number'),
+    )
 
     round_id = db.Column(db.Integer, primary_key=True)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'))
@@ -75,6 +180,10 @@ class Round(db.Model):
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (
+        db.Index('ix_matches_round_id_winner_id', 'round_id', 'winner_id'),
+        db.Index('ix_matches_winner_id_round_id', 'winner_id', 'round_id'),
+    )
 
     match_id = db.Column(db.Integer, primary_key=True)
     tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'))
@@ -87,6 +196,11 @@ class Match(db.Model):
     score_player2 = db.Column(db.Integer)
     winner_id = db.Column(db.Integer, db.ForeignKey('players.player_id'))
     second_place_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=True)
+    # Compare-and-swap counter: every ORM update of a match checks and bumps it, so of two workers
+    # writing the same match the second fails with StaleDataError instead of overwriting the first
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    __mapper_args__ = {"version_id_col": version}
 
     tournament = db.relationship('Tournament', backref='matches')
     player1 = db.relationship('Player', foreign_keys=[player1_id], backref='matches_as_player1')
@@ -95,3 +209,66 @@ class Match(db.Model):
 
     winner = db.relationship('Player', foreign_keys=[winner_id])
     second_place = db.relationship('Player', foreign_keys=[second_place_id])
+
+class BracketSlot(db.Model):
+    # One match of a knockout bracket, laid out for the whole knockout when it starts. Entrants are
+    # seeded into the first round and move along winner_to/loser_to as results come in
+    __tablename__ = 'bracket_slots'
+    __table_args__ = (
+        db.Index('ix_bracket_slots_tournament_id_match_id', 'tournament_id', 'match_id'),
+    )
+
+    slot_id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'), nullable=False)
+    # W(inners), L(osers) or grand F(inal), see pairing.bracket_layout
+    bracket = db.Column(db.String(1), nullable=False)
+    bracket_round = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    seed1 = db.Column(db.Integer, nullable=True)
+    seed2 = db.Column(db.Integer, nullable=True)
+    player1_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=True)
+    player2_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=True)
+    # Entrants still to come from feeder slots; at 0 the slot is played, or settled as a bye when one of them is missing
+    pending_entries = db.Column(db.Integer, nullable=False, default=0)
+    winner_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=True)
+    winner_to_slot_id = db.Column(db.Integer, db.ForeignKey('bracket_slots.slot_id'), nullable=True)
+    winner_to_position = db.Column(db.Integer, nullable=True)
+    loser_to_slot_id = db.Column(db.Integer, db.ForeignKey('bracket_slots.slot_id'), nullable=True)
+    loser_to_position = db.Column(db.Integer, nullable=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('matches.match_id'), nullable=True, unique=True)
+
+    winner_to = db.relationship('BracketSlot', remote_side=[slot_id], foreign_keys=[winner_to_slot_id])
+    loser_to = db.relationship('BracketSlot', remote_side=[slot_id], foreign_keys=[loser_to_slot_id])
+    match = db.relationship('Match')
+
+# Where each player of a knockout stands, kept in step with match results by knockout.py
+class KnockoutPlayer(db.Model):
+    __tablename__ = 'knockout_players'
+    __table_args__ = (
+        db.Index('ix_knockout_players_tournament_id_eliminated_bracket_player_id', 'tournament_id', 'eliminated', 'bracket', 'player_id'),
+        db.UniqueConstraint('tournament_id', 'player_id', name='uq_knockout_players_tournament_id_player_id'),
+    )
+
+    knockout_player_id = db.Column(db.Integer, primary_key=True)
+    tournament_id = db.Column(db.Integer, db.ForeignKey('tournaments.tournament_id'), nullable=False)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.player_id'), nullable=False)
+    losses = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # W(inners) until the first loss, then L(osers) in double elimination
+    bracket = db.Column(db.String(1), nullable=False, default='W', server_default='W')
+    eliminated = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+
+    player = db.relationship('Player')
+
+class IdempotencyKey(db.Model):
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.Index('ix_idempotency_keys_created_at', 'created_at'),
+    )
+
+    key = db.Column(db.String(100), primary_key=True)
+    # Hash of method, path and body; a key reused for a different request is rejected
+    fingerprint = db.Column(db.String(64), nullable=False)
+    # Empty until the response is stored, right after the transaction that claimed the key commits
+    status_code = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
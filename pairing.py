@@ -0,0 +1,259 @@
+import random
+
+# Pairing decisions without the database: inputs are plain player ids, points and result tuples,
+# the output is a list of Pairing objects for tournament.py to persist.
+#
+# group_rankings, the input for the group-stage decisions, is [(group_id, player_ids, points)]
+# with each group's players and points in standings order (points descending, draw order on ties)
+
+KNOCK_OUT_SINGLE_ELIMINATION = 2
+KNOCK_OUT_DOUBLE_ELIMINATION = 3
+
+
+class Pairing:
+    __slots__ = ('player1_id', 'player2_id', 'player3_id')
+
+    def __init__(self, player1_id, player2_id, player3_id=None):
+        self.player1_id = player1_id
+        self.player2_id = player2_id
+        self.player3_id = player3_id
+
+    def __eq__(self, other):
+        return isinstance(other, Pairing) and self.player_ids() == other.player_ids()
+
+    def __repr__(self):
+        return f"Pairing{self.player_ids()}"
+
+    def player_ids(self):
+        return (self.player1_id, self.player2_id, self.player3_id)
+
+
+def pair_in_order(player_ids):
+    # Neighbours play each other; an odd player out gets no match
+    return [Pairing(player_ids[i], player_ids[i + 1]) for i in range(0, len(player_ids) - 1, 2)]
+
+
+def random_pairings(player_ids, rng=random):
+    player_ids = list(player_ids)
+    rng.shuffle(player_ids)
+    return pair_in_order(player_ids)
+
+
+def knockout_pairings(group_rankings, num_advancing_players):
+    # First knockout round after the group stage
+    if len(group_rankings) == 1:
+        return pair_in_order(group_rankings[0][1][:num_advancing_players])
+
+    advancing = [(group_id, player_ids[:num_advancing_players]) for group_id, player_ids, _ in group_rankings]
+    first_seeds = [(player_ids[0], group_id) for group_id, player_ids in advancing if len(player_ids) > 0]
+    second_seeds = [(player_ids[1], group_id) for group_id, player_ids in advancing if len(player_ids) > 1]
+
+    # Each group winner meets the first remaining runner-up from another group
+    pairings = []
+    for first_seed_id, first_group_id in first_seeds:
+        for i, (second_seed_id, second_group_id) in enumerate(second_seeds):
+            if second_group_id != first_group_id:
+                pairings.append(Pairing(second_seed_id, first_seed_id))
+                del second_seeds[i]
+                break
+    return pairings
+
+
+def seed_order(size):
+    # Bracket positions of seeds 1..size for a power-of-two size, top seeds kept apart until the
+    # late rounds: [1, 8, 4, 5, 2, 7, 3, 6] for 8
+    order = [1]
+    while len(order) < size:
+        order = [seed for top in order for seed in (top, len(order) * 2 + 1 - top)]
+    return order
+
+
+def bracket_size(num_entrants):
+    size = 2
+    while size < num_entrants:
+        size *= 2
+    return size
+
+
+def first_round_pairs(seeds):
+    # The (player, player) pairs seeds meet in the first bracket round; pairs with a bye are left out
+    order = seed_order(bracket_size(len(seeds)))
+    return [(seeds[order[i] - 1], seeds[order[i + 1] - 1]) for i in range(0, len(order), 2)
+            if order[i] <= len(seeds) and order[i + 1] <= len(seeds)]
+
+
+def group_seeds(group_rankings, num_advancing_players):
+    # Knockout seeding after the group stage: the group winners first, then the runners-up and so on,
+    # each tier rotated so that first-round opponents come from different groups where possible
+    group_of = {player_id: group_id for group_id, player_ids, _ in group_rankings for player_id in player_ids}
+    seeds = []
+    for rank in range(num_advancing_players or 0):
+        tier = [player_ids[rank] for _, player_ids, _ in group_rankings if len(player_ids) > rank]
+        rotations = [seeds + tier[i:] + tier[:i] for i in range(len(tier))] or [seeds]
+        seeds = min(rotations, key=lambda candidate: sum(group_of[a] == group_of[b] for a, b in first_round_pairs(candidate)))
+    return seeds
+
+
+class Slot:
+    # One match of the bracket tree. winner_to/loser_to are indexes of the slots the winner and the
+    # loser move on to, with the position (1 or 2) they take there
+    __slots__ = ('bracket', 'bracket_round', 'position', 'seed1', 'seed2', 'winner_to', 'winner_to_position', 'loser_to', 'loser_to_position')
+
+    def __init__(self, bracket, bracket_round, position, seed1=None, seed2=None):
+        self.bracket = bracket
+        self.bracket_round = bracket_round
+        self.position = position
+        self.seed1 = seed1
+        self.seed2 = seed2
+        self.winner_to = self.winner_to_position = self.loser_to = self.loser_to_position = None
+
+    def __repr__(self):
+        return f"Slot({self.bracket}{self.bracket_round}.{self.position})"
+
+
+WINNERS_BRACKET = 'W'
+LOSERS_BRACKET = 'L'
+GRAND_FINAL = 'F'
+
+
+def bracket_layout(num_entrants, double_elimination=False):
+    # Slot tree of a whole knockout for seeds 1..num_entrants. The field is padded to a power of two;
+    # the padding seeds are byes (None), which the standard seed order hands to the top seeds.
+    # Double elimination adds a losers bracket and the grand final, followed by a reset that is only
+    # played when the winners bracket champion lost the first one: nobody is out after a single loss
+    slots = []
+
+    def add(bracket, bracket_round, count, seeds=None):
+        added = []
+        for position in range(count):
+            seed1, seed2 = seeds[2 * position:2 * position + 2] if seeds else (None, None)
+            slots.append(Slot(bracket, bracket_round, position, seed1, seed2))
+            added.append(len(slots) - 1)
+        return added
+
+    def advance(index, target, position):
+        slots[index].winner_to, slots[index].winner_to_position = target, position
+
+    def drop(index, target, position):
+        slots[index].loser_to, slots[index].loser_to_position = target, position
+
+    size = bracket_size(num_entrants)
+    winners = [add(WINNERS_BRACKET, 1, size // 2, [seed if seed <= num_entrants else None for seed in seed_order(size)])]
+    while len(winners[-1]) > 1:
+        current = add(WINNERS_BRACKET, len(winners) + 1, len(winners[-1]) // 2)
+        for i, index in enumerate(winners[-1]):
+            advance(index, current[i // 2], i % 2 + 1)
+        winners.append(current)
+    if not double_elimination:
+        return slots
+
+    def add_grand_final():
+        # The grand final, whose winner and, if it has to be played, loser meet again in the reset
+        final, reset = add(GRAND_FINAL, 1, 1) + add(GRAND_FINAL, 2, 1)
+        advance(final, reset, 1)
+        drop(final, reset, 2)
+        return final
+
+    if len(winners) == 1:
+        # Two players: the loser of the only match gets a second chance in the grand final
+        final = add_grand_final()
+        advance(winners[0][0], final, 1)
+        drop(winners[0][0], final, 2)
+        return slots
+
+    # Losers bracket: the first-round losers meet each other, then its rounds alternate between
+    # survivors meeting the losers of the next winners round, dropped in reverse order to put off
+    # rematches, and survivors meeting each other
+    losers = add(LOSERS_BRACKET, 1, size // 4)
+    for i, index in enumerate(winners[0]):
+        drop(index, losers[i // 2], i % 2 + 1)
+    losers_round = 1
+    for dropping in winners[1:]:
+        losers_round += 1
+        current = add(LOSERS_BRACKET, losers_round, len(losers))
+        for i, (survivor, dropped) in enumerate(zip(losers, reversed(dropping))):
+            advance(survivor, current[i], 1)
+            drop(dropped, current[i], 2)
+        losers = current
+        if len(losers) > 1:
+            losers_round += 1
+            current = add(LOSERS_BRACKET, losers_round, len(losers) // 2)
+            for i, index in enumerate(losers):
+                advance(index, current[i // 2], i % 2 + 1)
+            losers = current
+
+    final = add_grand_final()
+    advance(winners[-1][0], final, 1)
+    advance(losers[0], final, 2)
+    return slots
+
+
+def drops_loser(bracket, winner_position):
+    # Whether the loser of a slot moves on to its loser_to slot. The grand final's loser only goes on
+    # to the reset when that was the winners bracket champion, at position 1
+    return bracket != GRAND_FINAL or winner_position == 2
+
+
+def knockout_lives(format_id):
+    # Losses a player can take before being out of the knockout
+    return 2 if format_id == KNOCK_OUT_DOUBLE_ELIMINATION else 1
+
+
+def knockout_standing(format_id, losses):
+    # (bracket, eliminated) of a player with the given number of knockout losses
+    bracket = LOSERS_BRACKET if losses and format_id == KNOCK_OUT_DOUBLE_ELIMINATION else WINNERS_BRACKET
+    return bracket, losses >= knockout_lives(format_id)
+
+
+def elimination_pairings(format_id, active_players, rng=random):
+    # Next knockout round of a tournament without a bracket tree, from the (player_id, bracket) of the
+    # players still in. Each bracket is drawn on its own and an odd player out waits for the next
+    # round; the last players of the two brackets meet in the final, which the winners bracket
+    # player has to lose twice
+    winners = [player_id for player_id, bracket in active_players if bracket == WINNERS_BRACKET]
+    if format_id == KNOCK_OUT_SINGLE_ELIMINATION:
+        return random_pairings(winners, rng)
+    if format_id != KNOCK_OUT_DOUBLE_ELIMINATION:
+        return []
+
+    losers = [player_id for player_id, bracket in active_players if bracket == LOSERS_BRACKET]
+    if len(winners) == 1 and len(losers) == 1:
+        return [Pairing(winners[0], losers[0])]
+    return random_pairings(winners, rng) + random_pairings(losers, rng)
+
+
+def tied_players(player_ids, points, num_advancing_players):
+    # Players sharing one of the top point totals, walking down until the advancing spots are covered
+    tied = []
+    start = 0
+    for rank in range(num_advancing_players):
+        if start >= len(points):
+            break
+        end = start + 1
+        while end < len(points) and points[end] == points[start]:
+            end += 1
+        if end - start > 1:
+            tied.extend(player_ids[start:end])
+        if len(tied) >= num_advancing_players:
+            break
+        start = end
+    return tied
+
+
+def tiebreaker_pairings(group_rankings, num_advancing_players):
+    # Extra group-stage matches for ties that decide who advances. An odd number of tied players
+    # starts with one three-player match for the last three of them
+    pairings = []
+    for _, player_ids, points in group_rankings:
+        if len(player_ids) <= num_advancing_players:
+            continue
+
+        tied = tied_players(player_ids, points, num_advancing_players)
+        if len(tied) <= max(num_advancing_players, 1):
+            continue
+
+        if len(tied) % 2 == 1:
+            pairings.append(Pairing(*tied[-3:]))
+            tied = tied[:-3]
+        pairings.extend(pair_in_order(tied))
+    return pairings
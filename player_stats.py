@@ -0,0 +1,206 @@
+from collections import defaultdict
+from itertools import groupby
+from sqlalchemy import String, bindparam, case, func, insert, or_, select, union
+from models import db, Group, GroupPlayer, Match, PlayerStats, Round
+from bracket import feeds_next_slot
+from rankings import is_finished
+
+RECENT_FORM_LENGTH = 10
+
+stats_table = PlayerStats.__table__
+
+
+def outcome(player_id, winner_id, second_place_id):
+    if player_id == winner_id:
+        return 'W'
+    if player_id == second_place_id:
+        return 'S'
+    return 'L'
+
+
+def match_players(row):
+    return [player_id for player_id in (row.player1_id, row.player2_id, row.player3_id) if player_id is not None]
+
+
+def tournament_match_rows(tournament_ids=None):
+    # Every match of the given tournaments, or of all of them, grouped by tournament in the order played
+    query = select(
+        Match.match_id, Round.tournament_id, Match.group_id, Round.round_number,
+        Match.player1_id, Match.player2_id, Match.player3_id, Match.winner_id, Match.second_place_id,
+        feeds_next_slot().label('feeds_next_slot')
+    ).join(Round, Round.round_id == Match.round_id)
+    if tournament_ids is not None:
+        query = query.where(Round.tournament_id.in_(tournament_ids))
+    return db.session.execute(query.order_by(Round.tournament_id, Match.match_id)).all()
+
+
+def finishing_places(rows):
+    # {player_id: place} of a finished tournament, {} while it is running. Players are ranked by the
+    # furthest round they reached, the champion ahead of the other finalist; players knocked out in
+    # the same round share their place
+    if not is_finished(rows):
+        return {}
+    final = max(rows, key=lambda row: row.round_number)
+    reached = {}
+    for row in rows:
+        for player_id in match_players(row):
+            reached[player_id] = max(reached.get(player_id, 0), row.round_number)
+    keys = {player_id: (round_number, player_id == final.winner_id) for player_id, round_number in reached.items()}
+    first_place = {}
+    for place, key in enumerate(sorted(keys.values(), reverse=True), start=1):
+        first_place.setdefault(key, place)
+    return {player_id: first_place[key] for player_id, key in keys.items()}
+
+
+def add_tournament_entries(player_ids):
+    # Entrants of a new tournament, in the caller's transaction; players entering their first tournament get a row
+    existing = set(db.session.scalars(select(PlayerStats.player_id).where(PlayerStats.player_id.in_(player_ids))))
+    missing = [{"player_id": player_id} for player_id in player_ids if player_id not in existing]
+    if missing:
+        db.session.execute(insert(PlayerStats), missing)
+    db.session.execute(
+        stats_table.update()
+        .where(stats_table.c.player_id.in_(player_ids))
+        .values(tournaments_entered=stats_table.c.tournaments_entered + 1)
+    )
+
+
+def record_player_results(changed_matches):
+    # Counterpart of standings.record_results for the career totals. New results are added with one
+    # executemany UPDATE; a corrected result rebuilds the rows of the players of that match, since
+    # their recent form and best finish can't be patched in place
+    changes = defaultdict(lambda: [0, 0, 0, ''])  # player_id -> played, won, second places, form
+    corrected = set()
+    finals = []
+    corrected_finals = []
+    for match, previous_winner_id, previous_second_place_id in sorted(changed_matches, key=lambda change: change[0].match_id):
+        players = match_players(match)
+        if previous_winner_id is not None:
+            if (previous_winner_id, previous_second_place_id) != (match.winner_id, match.second_place_id):
+                corrected.update(players)
+                if match.group_id is None:
+                    corrected_finals.append(match)
+            continue
+        if match.winner_id is None:
+            continue
+        for player_id in players:
+            change = changes[player_id]
+            change[0] += 1
+            change[1] += player_id == match.winner_id
+            change[2] += player_id == match.second_place_id
+            change[3] = outcome(player_id, match.winner_id, match.second_place_id) + change[3]
+        if match.group_id is None:
+            finals.append(match)
+
+    rows = [{
+        "b_player_id": player_id,
+        "b_played": played,
+        "b_won": won,
+        "b_second_places": second_places,
+        "b_form": form
+    } for player_id, (played, won, second_places, form) in changes.items()]
+    if rows:
+        db.session.execute(
+            stats_table.update()
+            .where(stats_table.c.player_id == bindparam('b_player_id'))
+            .values(
+                matches_played=stats_table.c.matches_played + bindparam('b_played'),
+                matches_won=stats_table.c.matches_won + bindparam('b_won'),
+                second_places=stats_table.c.second_places + bindparam('b_second_places'),
+                recent_form=func.substr(bindparam('b_form', type_=String) + stats_table.c.recent_form, 1, RECENT_FORM_LENGTH)
+            ),
+            rows
+        )
+
+    # Only a knockout match alone in its round can be a final; the full scan is left for those
+    for match in finals:
+        if alone_in_round(match):
+            record_finish(match.tournament_id)
+    # A corrected grand final decides afresh whether the reset is played, so the tournament may be
+    # finished or running again and everyone's finish can change
+    for match in corrected_finals:
+        if alone_in_round(match):
+            corrected.update(tournament_player_ids(db.session.get(Round, match.round_id).tournament_id))
+
+    if corrected:
+        rebuild_player_stats(corrected)
+
+
+def alone_in_round(match):
+    return db.session.query(func.count(Match.match_id)).filter(Match.round_id == match.round_id).scalar() == 1
+
+
+def record_finish(tournament_id):
+    rows = [{"b_player_id": player_id, "b_place": place} for player_id, place in finishing_places(tournament_match_rows([tournament_id])).items()]
+    if rows:
+        db.session.execute(
+            stats_table.update()
+            .where(stats_table.c.player_id == bindparam('b_player_id'))
+            .values(best_finish=case(
+                (or_(stats_table.c.best_finish.is_(None), stats_table.c.best_finish > bindparam('b_place')), bindparam('b_place')),
+                else_=stats_table.c.best_finish
+            )),
+            rows
+        )
+
+
+def tournament_player_ids(tournament_id):
+    return set(db.session.scalars(union(
+        select(GroupPlayer.player_id).join(Group, Group.group_id == GroupPlayer.group_id).where(Group.tournament_id == tournament_id),
+        *(select(column).join(Round, Round.round_id == Match.round_id).where(Round.tournament_id == tournament_id, column.isnot(None))
+          for column in (Match.player1_id, Match.player2_id, Match.player3_id))
+    )))
+
+
+def rebuild_player_stats(player_ids=None):
+    # Recreate the rows of the given players, or of everyone, from the matches and group entries
+    player_filter = (lambda column: column.in_(player_ids)) if player_ids is not None else (lambda column: column.isnot(None))
+    entries = db.session.execute(union(
+        select(Group.tournament_id, GroupPlayer.player_id).join(Group, Group.group_id == GroupPlayer.group_id).where(player_filter(GroupPlayer.player_id)),
+        *(select(Round.tournament_id, column).join(Round, Round.round_id == Match.round_id).where(player_filter(column))
+          for column in (Match.player1_id, Match.player2_id, Match.player3_id))
+    )).all()
+
+    totals = {}
+    for tournament_id, player_id in entries:
+        totals.setdefault(player_id, {"player_id": player_id, "matches_played": 0, "matches_won": 0, "second_places": 0,
+                                      "tournaments_entered": 0, "best_finish": None, "recent_form": ''})
+        totals[player_id]["tournaments_entered"] += 1
+
+    tournament_ids = {tournament_id for tournament_id, _ in entries} if player_ids is not None else None
+    for _, rows in groupby(tournament_match_rows(tournament_ids), key=lambda row: row.tournament_id):
+        rows = list(rows)
+        for row in rows:
+            if row.winner_id is None:
+                continue
+            for player_id in match_players(row):
+                if player_id in totals:
+                    total = totals[player_id]
+                    total["matches_played"] += 1
+                    total["matches_won"] += player_id == row.winner_id
+                    total["second_places"] += player_id == row.second_place_id
+                    total["recent_form"] = (outcome(player_id, row.winner_id, row.second_place_id) + total["recent_form"])[:RECENT_FORM_LENGTH]
+        for player_id, place in finishing_places(rows).items():
+            if player_id in totals and (totals[player_id]["best_finish"] is None or place < totals[player_id]["best_finish"]):
+                totals[player_id]["best_finish"] = place
+
+    delete_query = PlayerStats.query
+    if player_ids is not None:
+        delete_query = delete_query.filter(PlayerStats.player_id.in_(player_ids))
+    delete_query.delete(synchronize_session=False)
+    if totals:
+        db.session.execute(insert(PlayerStats), list(totals.values()))
+    return len(totals)
+
+
+def get_player_stats(player_id):
+    stats = db.session.get(PlayerStats, player_id)
+    return {
+        "player_id": player_id,
+        "matches_played": stats.matches_played if stats else 0,
+        "matches_won": stats.matches_won if stats else 0,
+        "second_places": stats.second_places if stats else 0,
+        "tournaments_entered": stats.tournaments_entered if stats else 0,
+        "best_finish": stats.best_finish if stats else None,
+        "recent_form": list(stats.recent_form) if stats else [],
+    }
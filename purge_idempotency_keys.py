@@ -0,0 +1,16 @@
+from models import db
+from app import app
+from idempotency import purge_idempotency_keys
+
+# Remove the Idempotency-Key records of POST requests older than idempotency.KEY_TTL
+def purge_keys():
+    with app.app_context():
+        try:
+            num_rows = purge_idempotency_keys()
+            db.session.commit()
+            print(f"Removed {num_rows} expired idempotency keys.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error removing idempotency keys: {e}")
+
+purge_keys()
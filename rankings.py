@@ -0,0 +1,89 @@
+import threading
+import time
+from models import db, Player, Tournament, Round, Match
+from bracket import feeds_next_slot
+
+# Rankings of running tournaments may be written by another worker, so they expire after a few
+# seconds; finished tournaments never change and stay cached until a write invalidates them
+UNFINISHED_TTL_SECONDS = 5
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def compute_rankings(tournament_id, session=None):
+    session = session or db.session
+    # Version first, so the cached rankings are never older than the version they are tagged with
+    version = session.query(Tournament.version).filter_by(tournament_id=tournament_id).scalar()
+
+    # One pass over the tournament's matches, every participant column including player3
+    rows = session.query(
+        Match.player1_id, Match.player2_id, Match.player3_id, Match.winner_id, Match.group_id, Round.round_number,
+        feeds_next_slot().label('feeds_next_slot')
+    ).join(Round, Round.round_id == Match.round_id).filter(Round.tournament_id == tournament_id).all()
+
+    highest_round = {}
+    matches_won = {}
+    knockout_wins = set()  # (player_id, round_number)
+    for player1_id, player2_id, player3_id, winner_id, group_id, round_number, _ in rows:
+        for player_id in (player1_id, player2_id, player3_id):
+            if player_id is not None and highest_round.get(player_id, 0) < round_number:
+                highest_round[player_id] = round_number
+        if winner_id is not None:
+            matches_won[winner_id] = matches_won.get(winner_id, 0) + 1
+            if group_id is None:
+                knockout_wins.add((winner_id, round_number))
+
+    names = dict(session.query(Player.player_id, Player.name).filter(Player.player_id.in_(highest_round)).all()) if highest_round else {}
+    rankings = sorted(({
+        "player_id": player_id,
+        "name": names.get(player_id),
+        "highest_round": round_number,
+        "matches_won": matches_won.get(player_id, 0)
+    } for player_id, round_number in highest_round.items()),
+        # Among players out in the same knockout round, who won there comes first: the champion of a
+        # double elimination may have fewer wins than the finalist from the losers bracket
+        key=lambda p: (-p['highest_round'], (p['player_id'], p['highest_round']) not in knockout_wins, -p['matches_won'], p['player_id']))
+
+    return rankings, version, is_finished(rows)
+
+
+def is_finished(rows):
+    # Finished once the last round is a single decided knockout match whose winner doesn't move on
+    # in the bracket, i.e. the final has been played
+    if not rows:
+        return False
+    last_round_number = max(row.round_number for row in rows)
+    last_round = [row for row in rows if row.round_number == last_round_number]
+    return len(last_round) == 1 and last_round[0].winner_id is not None and last_round[0].group_id is None and not last_round[0].feeds_next_slot
+
+
+def get_rankings(tournament_id, session=None, current_version=None):
+    # Returns the rankings and the tournament version they were computed at, which is what their ETag
+    # has to name. Given the current version, a cached entry of an older one is recomputed right away
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(tournament_id)
+    if entry is not None:
+        rankings, version, expires_at = entry
+        if (expires_at is None or expires_at > now) and (current_version is None or version == current_version):
+            return rankings, version
+
+    rankings, version, finished = compute_rankings(tournament_id, session)
+    with _cache_lock:
+        _cache[tournament_id] = (rankings, version, None if finished else now + UNFINISHED_TTL_SECONDS)
+    return rankings, version
+
+
+def cached_finished_version(tournament_id):
+    # Version of a finished tournament's cached rankings, so conditional requests need no database
+    with _cache_lock:
+        entry = _cache.get(tournament_id)
+    if entry is not None and entry[2] is None:
+        return entry[1]
+    return None
+
+
+def invalidate_rankings(tournament_id):
+    with _cache_lock:
+        _cache.pop(tournament_id, None)
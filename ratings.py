@@ -0,0 +1,264 @@
+from collections import defaultdict
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, select
+from models import db, Match, Player, PlayerRating, RatingChange, Round
+from player_stats import match_players
+
+# Elo-style ratings: a 400 point difference means 10:1 odds, like the strengths of simulator.py.
+# Every pair of players in a match counts as a game between them; a player's K factor is split over
+# their opponents, so a three-player tiebreaker moves ratings as much as a regular match
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+
+ratings_table = PlayerRating.__table__
+
+
+def match_ranks(players, winner_id, second_place_id):
+    # Finishing position per participant; the two losers of a three-player match without a recorded
+    # second place share theirs
+    last = 1 if len(players) == 2 else 2
+    return [0 if player_id == winner_id else 1 if player_id == second_place_id else last for player_id in players]
+
+
+def rate_match(ratings, players, winner_id, second_place_id):
+    # New ratings of the participants of one match, given {player_id: rating}
+    ranks = match_ranks(players, winner_id, second_place_id)
+    current = [ratings.get(player_id, INITIAL_RATING) for player_id in players]
+    weight = K_FACTOR / (len(players) - 1)
+    new = []
+    for i in range(len(players)):
+        delta = 0.0
+        for j in range(len(players)):
+            if i != j:
+                expected = 1 / (1 + 10 ** ((current[j] - current[i]) / 400))
+                actual = 1.0 if ranks[i] < ranks[j] else 0.5 if ranks[i] == ranks[j] else 0.0
+                delta += actual - expected
+        new.append(current[i] + weight * delta)
+    return new
+
+
+def save_ratings(ratings, match_counts, known):
+    # Writes {player_id: rating}, adding match_counts to rated_matches; players not in known get a row
+    updates = [{"b_player_id": player_id, "b_rating": rating, "b_matches": match_counts.get(player_id, 0)}
+               for player_id, rating in ratings.items() if player_id in known]
+    if updates:
+        db.session.execute(
+            ratings_table.update()
+            .where(ratings_table.c.player_id == bindparam('b_player_id'))
+            .values(rating=bindparam('b_rating'), rated_matches=ratings_table.c.rated_matches + bindparam('b_matches')),
+            updates
+        )
+    inserts = [{"player_id": player_id, "rating": rating, "rated_matches": match_counts.get(player_id, 0)}
+               for player_id, rating in ratings.items() if player_id not in known]
+    if inserts:
+        db.session.execute(insert(PlayerRating), inserts)
+
+
+def rate_new_matches(matches):
+    # Appends freshly decided matches to the rating log; only their participants are read and written
+    player_ids = {player_id for match in matches for player_id in match_players(match)}
+    ratings = dict(db.session.query(PlayerRating.player_id, PlayerRating.rating).filter(PlayerRating.player_id.in_(player_ids)).all())
+    known = set(ratings)
+    sequence = db.session.query(func.max(RatingChange.sequence)).scalar() or 0
+
+    match_counts = defaultdict(int)
+    changes = []
+    for match in matches:
+        sequence += 1
+        players = match_players(match)
+        before = [ratings.get(player_id, INITIAL_RATING) for player_id in players]
+        after = rate_match(ratings, players, match.winner_id, match.second_place_id)
+        for player_id, rating_before, rating_after in zip(players, before, after):
+            ratings[player_id] = rating_after
+            match_counts[player_id] += 1
+            changes.append({"match_id": match.match_id, "player_id": player_id, "sequence": sequence,
+                            "rating_before": rating_before, "rating_after": rating_after})
+    save_ratings(ratings, match_counts, known)
+    db.session.execute(insert(RatingChange), changes)
+
+
+def replay_ratings(sequence, dropped_match_ids=()):
+    # Re-rates every match logged from sequence onward with the current results, starting each of
+    # their players from the rating they had before it. Matches in dropped_match_ids leave the log
+    log = db.session.execute(
+        select(RatingChange.sequence, RatingChange.player_id, RatingChange.rating_before,
+               Match.match_id, Match.player1_id, Match.player2_id, Match.player3_id, Match.winner_id, Match.second_place_id)
+        .join(Match, Match.match_id == RatingChange.match_id)
+        .where(RatingChange.sequence >= sequence)
+        .order_by(RatingChange.sequence, RatingChange.match_id)
+    ).all()
+    if not log:
+        return 0
+
+    ratings = {}
+    match_counts = defaultdict(int)
+    matches = {}
+    for row in log:
+        ratings.setdefault(row.player_id, row.rating_before)
+        match_counts[row.player_id] -= 1
+        matches.setdefault(row.match_id, row)
+    db.session.execute(delete(RatingChange).where(RatingChange.sequence >= sequence))
+
+    changes = []
+    for match in matches.values():
+        if match.match_id in dropped_match_ids or match.winner_id is None:
+            continue
+        players = match_players(match)
+        before = [ratings[player_id] for player_id in players]
+        after = rate_match(ratings, players, match.winner_id, match.second_place_id)
+        for player_id, rating_before, rating_after in zip(players, before, after):
+            ratings[player_id] = rating_after
+            match_counts[player_id] += 1
+            changes.append({"match_id": match.match_id, "player_id": player_id, "sequence": match.sequence,
+                            "rating_before": rating_before, "rating_after": rating_after})
+    save_ratings(ratings, match_counts, set(ratings))
+    # Players left without a rated match are unrated again, as after a full recompute
+    db.session.execute(delete(PlayerRating).where(PlayerRating.player_id.in_(ratings), PlayerRating.rated_matches == 0))
+    if changes:
+        db.session.execute(insert(RatingChange), changes)
+    return len(matches)
+
+
+def record_ratings(changed_matches):
+    # Counterpart of record_results for the ratings, in the caller's transaction. New results cost
+    # O(1) per match; a corrected result is replayed from its place in the log
+    new_matches = []
+    corrected_ids = []
+    for match, previous_winner_id, previous_second_place_id in changed_matches:
+        if previous_winner_id is None:
+            if match.winner_id is not None:
+                new_matches.append(match)
+        elif (previous_winner_id, previous_second_place_id) != (match.winner_id, match.second_place_id):
+            corrected_ids.append(match.match_id)
+
+    sequence = None
+    if corrected_ids:
+        logged = dict(db.session.query(RatingChange.match_id, RatingChange.sequence).filter(RatingChange.match_id.in_(corrected_ids)).all())
+        sequence = min(logged.values()) if logged else None
+        # Results from before the ratings existed are not in the log yet and get rated like new ones
+        new_matches.extend(match for match, _, _ in changed_matches if match.match_id in corrected_ids and match.match_id not in logged)
+    if new_matches:
+        rate_new_matches(sorted(new_matches, key=lambda match: match.match_id))
+    if sequence is not None:
+        replay_ratings(sequence)
+
+
+def forget_tournament_ratings(tournament_id):
+    # Takes the matches of a tournament that is about to be deleted out of everyone's ratings
+    match_ids = set(db.session.scalars(select(Match.match_id).join(Round, Round.round_id == Match.round_id).where(Round.tournament_id == tournament_id)))
+    sequence = db.session.query(func.min(RatingChange.sequence)).filter(RatingChange.match_id.in_(match_ids)).scalar() if match_ids else None
+    if sequence is not None:
+        replay_ratings(sequence, match_ids)
+
+
+def compute_ratings(matches):
+    # Rates [(match_id, players, winner_id, second_place_id)] in the given order, vectorized.
+    # A match goes into the wave after the latest wave of any of its players, so nobody plays twice in
+    # a wave and everyone's matches keep their order. The matches of a wave don't depend on each other,
+    # so rating a whole wave from the ratings at its start gives the same result as rating its matches
+    # one after another. Returns (player_ids, ratings, rated_matches, log rows)
+    participants = np.array([tuple(players) + (-1,) * (3 - len(players)) for _, players, _, _ in matches], dtype=np.int64).reshape(-1, 3)
+    winners = np.array([winner_id for _, _, winner_id, _ in matches], dtype=np.int64)
+    seconds = np.array([-1 if second_place_id is None else second_place_id for _, _, _, second_place_id in matches], dtype=np.int64)
+    present = participants >= 0
+    player_ids, player_index = np.unique(participants[present], return_inverse=True)
+    slots = np.full(participants.shape, -1, dtype=np.intp)
+    slots[present] = player_index
+
+    # The only sequential step: which wave every match is played in
+    last_wave = [-1] * len(player_ids)
+    match_wave = []
+    for a, b, c in slots.tolist():
+        wave = max(last_wave[a], last_wave[b], last_wave[c] if c >= 0 else -1) + 1
+        last_wave[a] = last_wave[b] = wave
+        if c >= 0:
+            last_wave[c] = wave
+        match_wave.append(wave)
+    match_wave = np.array(match_wave, dtype=np.intp)
+
+    # Same finishing positions as match_ranks
+    ranks = np.where(participants == winners[:, None], 0, np.where(participants == seconds[:, None], 1, np.where(present[:, 2], 2, 1)[:, None]))
+    weights = K_FACTOR / (present.sum(axis=1) - 1)
+    pair_match, pair_a, pair_b, pair_actual = [], [], [], []
+    for i, j in ((0, 1), (0, 2), (1, 2)):
+        rows = np.flatnonzero(present[:, j])
+        pair_match.append(rows)
+        pair_a.append(slots[rows, i])
+        pair_b.append(slots[rows, j])
+        pair_actual.append(np.where(ranks[rows, i] < ranks[rows, j], 1.0, np.where(ranks[rows, i] == ranks[rows, j], 0.5, 0.0)))
+    slot_match = np.concatenate([np.flatnonzero(present[:, i]) for i in range(3)])
+    slot_player = np.concatenate([slots[present[:, i], i] for i in range(3)])
+
+    pair_match = np.concatenate(pair_match)
+    pair_order = np.argsort(match_wave[pair_match], kind='stable')
+    slot_order = np.lexsort((slot_match, match_wave[slot_match]))
+    pair_a = np.concatenate(pair_a)[pair_order]
+    pair_b = np.concatenate(pair_b)[pair_order]
+    pair_actual = np.concatenate(pair_actual)[pair_order]
+    pair_weight = weights[pair_match][pair_order]
+    slot_match = slot_match[slot_order]
+    slot_player = slot_player[slot_order]
+    num_waves = int(match_wave.max()) + 1 if len(matches) else 0
+    pair_bounds = np.searchsorted(match_wave[pair_match][pair_order], np.arange(num_waves + 1))
+    slot_bounds = np.searchsorted(match_wave[slot_match], np.arange(num_waves + 1))
+
+    ratings = np.full(len(player_ids), INITIAL_RATING)
+    before = np.empty(len(slot_player))
+    after = np.empty(len(slot_player))
+    for wave in range(num_waves):
+        pairs = slice(pair_bounds[wave], pair_bounds[wave + 1])
+        wave_slots = slice(slot_bounds[wave], slot_bounds[wave + 1])
+        a, b = pair_a[pairs], pair_b[pairs]
+        expected = 1 / (1 + 10 ** ((ratings[b] - ratings[a]) / 400))
+        change = pair_weight[pairs] * (pair_actual[pairs] - expected)
+        before[wave_slots] = ratings[slot_player[wave_slots]]
+        np.add.at(ratings, a, change)
+        np.add.at(ratings, b, -change)
+        after[wave_slots] = ratings[slot_player[wave_slots]]
+
+    rated_matches = np.bincount(slot_player, minlength=len(player_ids))
+    player_ids = player_ids.tolist()
+    log = [{
+        "match_id": matches[m][0],
+        "player_id": player_ids[p],
+        "sequence": m + 1,
+        "rating_before": rating_before,
+        "rating_after": rating_after
+    } for m, p, rating_before, rating_after in zip(slot_match.tolist(), slot_player.tolist(), before.tolist(), after.tolist())]
+    return player_ids, ratings, rated_matches, log
+
+
+def recompute_ratings():
+    # Rebuilds ratings and log from every decided match: in the order they were rated, with results
+    # from before the log existed first, by match id
+    logged = dict(db.session.query(RatingChange.match_id, func.min(RatingChange.sequence)).group_by(RatingChange.match_id).all())
+    rows = db.session.execute(
+        select(Match.match_id, Match.player1_id, Match.player2_id, Match.player3_id, Match.winner_id, Match.second_place_id)
+        .where(Match.winner_id.isnot(None))
+    ).all()
+    matches = sorted((
+        (match_id, [player_id for player_id in (player1_id, player2_id, player3_id) if player_id is not None], winner_id, second_place_id)
+        for match_id, player1_id, player2_id, player3_id, winner_id, second_place_id in rows
+    ), key=lambda match: (match[0] in logged, logged.get(match[0], 0), match[0]))
+    player_ids, ratings, rated_matches, log = compute_ratings(matches)
+
+    db.session.execute(delete(RatingChange))
+    db.session.execute(delete(PlayerRating))
+    if player_ids:
+        db.session.execute(ratings_table.insert(), [{"player_id": player_id, "rating": rating, "rated_matches": count}
+                                                    for player_id, rating, count in zip(player_ids, ratings.tolist(), rated_matches.tolist())])
+        db.session.execute(RatingChange.__table__.insert(), log)
+    return len(rows)
+
+
+def get_rating(player_id):
+    rating = db.session.get(PlayerRating, player_id)
+    return {"rating": rating.rating if rating else INITIAL_RATING, "rated_matches": rating.rated_matches if rating else 0}
+
+
+def rating_leaderboard(limit):
+    rows = db.session.query(PlayerRating.player_id, Player.name, PlayerRating.rating, PlayerRating.rated_matches).join(
+        Player, Player.player_id == PlayerRating.player_id
+    ).order_by(PlayerRating.rating.desc(), PlayerRating.player_id).limit(limit).all()
+    return [{"player_id": player_id, "name": name, "rating": rating, "rated_matches": rated_matches}
+            for player_id, name, rating, rated_matches in rows]
@@ -0,0 +1,16 @@
+from models import db
+from app import app
+from knockout import rebuild_knockout_players
+
+# Recreate the knockout_players table from the recorded knockout matches
+def rebuild_knockout():
+    with app.app_context():
+        try:
+            num_rows = rebuild_knockout_players()
+            db.session.commit()
+            print(f"Rebuilt the knockout state of {num_rows} players.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding knockout players: {e}")
+
+rebuild_knockout()
@@ -0,0 +1,16 @@
+from models import db
+from app import app
+from player_stats import rebuild_player_stats
+
+# Recreate the player_stats table from the recorded tournaments and match results
+def rebuild_stats():
+    with app.app_context():
+        try:
+            num_rows = rebuild_player_stats()
+            db.session.commit()
+            print(f"Rebuilt career stats of {num_rows} players.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding player stats: {e}")
+
+rebuild_stats()
@@ -0,0 +1,16 @@
+from models import db
+from app import app
+from standings import rebuild_group_standings
+
+# Recreate the group_standings table from the recorded match results
+def rebuild_standings():
+    with app.app_context():
+        try:
+            num_rows = rebuild_group_standings()
+            db.session.commit()
+            print(f"Rebuilt {num_rows} group standings.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error rebuilding group standings: {e}")
+
+rebuild_standings()
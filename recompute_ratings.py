@@ -0,0 +1,18 @@
+import time
+from models import db
+from app import app
+from ratings import recompute_ratings
+
+# Recompute every rating from the recorded match results, e.g. after a deploy that changed the rating rules
+def recompute():
+    with app.app_context():
+        try:
+            start = time.perf_counter()
+            num_matches = recompute_ratings()
+            db.session.commit()
+            print(f"Rated {num_matches} matches in {time.perf_counter() - start:.2f}s.")
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error recomputing ratings: {e}")
+
+recompute()
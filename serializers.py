@@ -0,0 +1,74 @@
+from sqlalchemy.orm import joinedload
+from models import db, Player, Round, Match
+
+# Every relationship the match payload touches, loaded together with the match rows
+# so serializing a round costs one query no matter how many matches it has
+MATCH_LOAD_OPTIONS = (
+    joinedload(Match.player1),
+    joinedload(Match.player2),
+    joinedload(Match.player3),
+    joinedload(Match.winner),
+    joinedload(Match.second_place),
+    joinedload(Match.group),
+)
+
+
+# The read helpers take an optional session: Flask-SQLAlchemy's by default, the sync side of an
+# AsyncSession when asgi.py runs them through run_sync
+def find_round(tournament_id, round_number=None, session=None):
+    # Latest round of the tournament unless a specific round number is requested
+    query = (session or db.session).query(Round).filter_by(tournament_id=tournament_id)
+    if round_number is not None:
+        return query.filter_by(round_number=round_number).first()
+    return query.order_by(Round.round_number.desc()).first()
+
+
+def load_round_matches(round_id, session=None):
+    return (session or db.session).query(Match).options(*MATCH_LOAD_OPTIONS).filter_by(round_id=round_id).order_by(Match.match_id).all()
+
+
+def load_matches(match_ids):
+    if not match_ids:
+        return []
+    return Match.query.options(*MATCH_LOAD_OPTIONS).filter(Match.match_id.in_(match_ids)).order_by(Match.match_id).all()
+
+
+def serialize_player(player):
+    if player is None:
+        return None
+    return {"player_id": player.player_id, "name": player.name}
+
+
+def serialize_match(match):
+    return {
+        "match_id": match.match_id,
+        "group_number": match.group.group_number if match.group else None,
+        "player1": serialize_player(match.player1),
+        "player2": serialize_player(match.player2),
+        "player3": serialize_player(match.player3),
+        "winner_id": match.winner_id,
+        "winner_name": match.winner.name if match.winner else None,
+        "second_place_id": match.second_place_id,
+        "second_place": serialize_player(match.second_place),
+        "version": match.version,
+    }
+
+
+def player_names(player_ids, session=None):
+    player_ids = {player_id for player_id in player_ids if player_id is not None}
+    if not player_ids:
+        return {}
+    return dict((session or db.session).query(Player.player_id, Player.name).filter(Player.player_id.in_(player_ids)).all())
+
+
+def serialize_pairing(pairing, names):
+    # Not yet saved matches; the player3 key is only present for three-player matches
+    data = {}
+    for key, player_id in zip(("player1", "player2", "player3"), pairing.player_ids()):
+        if player_id is not None:
+            data[key] = {"player_id": player_id, "name": names.get(player_id)}
+    return data
+
+
+def serialize_matches(matches):
+    return [serialize_match(match) for match in matches]
@@ -0,0 +1,290 @@
+import argparse
+import json
+import random
+import time
+import numpy as np
+from pairing import bracket_layout, drops_loser, group_seeds, tiebreaker_pairings, KNOCK_OUT_SINGLE_ELIMINATION, KNOCK_OUT_DOUBLE_ELIMINATION
+
+# Monte Carlo runs of whole tournaments under the rules in tournament.py and pairing.py, to compare
+# formats before a league night. The group stage of every simulation is drawn and played in one NumPy
+# batch; tiebreakers go through the pairing engine and the knockout through the bracket tree of
+# bracket.py, one simulation at a time.
+#
+# Strengths are Elo-style ratings: a 400 point difference means 10:1 odds in a two-player match
+
+MAX_SIMULATIONS = 100000
+# Tiebreak rounds played before the knockout goes ahead with whatever order is left
+MAX_TIEBREAK_ROUNDS = 5
+
+
+def auto_num_groups(num_players):
+    # Same split as create_groups_auto
+    if num_players <= 5:
+        return 1
+    elif num_players <= 13:
+        return 2
+    return 4
+
+
+def win_probabilities(strengths):
+    strengths = np.asarray(strengths, dtype=float)
+    return 1 / (1 + 10 ** ((strengths[None, :] - strengths[:, None]) / 400))
+
+
+def group_fixtures(num_players, num_groups, group_stage_format_id):
+    # Positions in the shuffled draw that meet in the group stage, like group_match_rows
+    position_a, position_b = [], []
+    for group in range(num_groups):
+        positions = list(range(group, num_players, num_groups))
+        for i in range(len(positions)):
+            for j in range(i + 1, len(positions)):
+                position_a.append(positions[i])
+                position_b.append(positions[j])
+                if group_stage_format_id == 3:  # Each player should play each other twice
+                    position_a.append(positions[j])
+                    position_b.append(positions[i])
+    return np.array(position_a, dtype=np.intp), np.array(position_b, dtype=np.intp)
+
+
+def simulate_group_stage(np_rng, win_prob, num_simulations, num_groups, group_stage_format_id):
+    # Returns the draws (player index at each shuffled position), the points per player and the
+    # positions of each simulation sorted into group standings order
+    num_players = len(win_prob)
+    draws = np_rng.random((num_simulations, num_players)).argsort(axis=1)
+
+    position_a, position_b = group_fixtures(num_players, num_groups, group_stage_format_id)
+    player_a = draws[:, position_a]
+    player_b = draws[:, position_b]
+    winners = np.where(np_rng.random(player_a.shape) < win_prob[player_a, player_b], player_a, player_b)
+    offsets = np.arange(num_simulations)[:, None] * num_players
+    points = np.bincount((winners + offsets).ravel(), minlength=num_simulations * num_players)
+    points = points.reshape(num_simulations, num_players).astype(float)
+
+    # Order by group, then points descending, then draw order, like group_rankings
+    positions = np.arange(num_players)
+    position_points = np.take_along_axis(points, draws, axis=1)
+    order = np.lexsort((np.broadcast_to(positions, draws.shape), -position_points, np.broadcast_to(positions % num_groups, draws.shape)), axis=-1)
+    return draws, points, order, len(position_a)
+
+
+class MatchPlayer:
+    # Plays single matches for one simulation at a time with precomputed odds
+    def __init__(self, strengths, rng):
+        self.win_prob = win_probabilities(strengths).tolist()
+        self.weights = (10 ** (np.asarray(strengths, dtype=float) / 400)).tolist()
+        self.rng = rng
+
+    def play(self, player1, player2):
+        return player1 if self.rng.random() < self.win_prob[player1][player2] else player2
+
+    def play_three(self, players):
+        # Winner and second place drawn in proportion to the players' odds
+        players = list(players)
+        placed = []
+        for _ in range(2):
+            weights = [self.weights[player] for player in players]
+            pick = self.rng.random() * sum(weights)
+            for i, weight in enumerate(weights):
+                pick -= weight
+                if pick < 0 or i == len(weights) - 1:
+                    placed.append(players.pop(i))
+                    break
+        return placed
+
+
+def rank_group(player_ids, points):
+    # Stable sort keeps the draw order among equal points
+    ranked = sorted(range(len(player_ids)), key=lambda i: -points[player_ids[i]])
+    return [player_ids[i] for i in ranked], [points[player_ids[i]] for i in ranked]
+
+
+def play_tiebreakers(match_player, rankings, points, num_advancing_players):
+    # Tiebreak rounds until the advancing spots are decided; returns the matches played
+    num_matches = 0
+    for _ in range(MAX_TIEBREAK_ROUNDS):
+        pairings = tiebreaker_pairings(rankings, num_advancing_players)
+        if not pairings:
+            break
+        for pairing in pairings:
+            if pairing.player3_id is None:
+                points[match_player.play(pairing.player1_id, pairing.player2_id)] += 1
+            else:
+                winner, second_place = match_player.play_three(pairing.player_ids())
+                points[winner] += 1
+                points[second_place] += 0.5
+        num_matches += len(pairings)
+        rankings = [(group_id, *rank_group(player_ids, points)) for group_id, player_ids, _ in rankings]
+    return rankings, num_matches
+
+
+class Bracket:
+    # In-memory slot tree of bracket_layout for a number of entrants, shared by every simulation
+    def __init__(self, num_entrants, double_elimination):
+        self.layout = bracket_layout(num_entrants, double_elimination)
+        self.pending = [0] * len(self.layout)
+        for slot in self.layout:
+            for target in (slot.winner_to, slot.loser_to):
+                if target is not None:
+                    self.pending[target] += 1
+
+    def play(self, match_player, seeds, reached):
+        # Plays the knockout for the seeds in order, best first, moving winners and losers on like
+        # bracket.py. Each round is every slot with both entrants in, as create_next_round_matches
+        # finds them. Returns the champion and the matches played
+        layout = self.layout
+        players = [[seeds[slot.seed1 - 1] if slot.seed1 else None, seeds[slot.seed2 - 1] if slot.seed2 else None] for slot in layout]
+        pending = list(self.pending)
+        winners = [None] * len(layout)
+        ready = []
+
+        def enter(index, position, player):
+            if player is not None:
+                players[index][position - 1] = player
+            pending[index] -= 1
+            if pending[index] == 0:
+                settle(index)
+
+        def settle(index):
+            entrants = [player for player in players[index] if player is not None]
+            if len(entrants) < 2:
+                resolve(index, entrants[0] if entrants else None, None)
+            else:
+                ready.append(index)
+
+        def resolve(index, winner, loser):
+            winners[index] = winner
+            slot = layout[index]
+            if slot.winner_to is not None:
+                enter(slot.winner_to, slot.winner_to_position, winner)
+            if slot.loser_to is not None:
+                enter(slot.loser_to, slot.loser_to_position, loser if drops_loser(slot.bracket, players[index].index(winner) + 1) else None)
+
+        for index, entries in enumerate(self.pending):
+            if entries == 0:
+                settle(index)
+        num_matches = 0
+        knockout_round = 0
+        while ready:
+            knockout_round += 1
+            current, ready = ready, []
+            for index in current:
+                player1, player2 = players[index]
+                reached[player1] = reached[player2] = knockout_round
+                winner = match_player.play(player1, player2)
+                resolve(index, winner, player2 if winner == player1 else player1)
+            num_matches += len(current)
+        # The last slot is the final, or the grand final's reset in double elimination
+        return winners[-1], num_matches
+
+
+def simulate(strengths, group_stage_format_id=2, knock_out_stage_format_id=2, num_groups='Auto',
+             advancing_players=2, num_simulations=10000, seed=None):
+    num_players = len(strengths)
+    if num_players < 2:
+        raise ValueError("At least two players are needed")
+    if not 1 <= num_simulations <= MAX_SIMULATIONS:
+        raise ValueError(f"The number of simulations must be between 1 and {MAX_SIMULATIONS}")
+    if knock_out_stage_format_id not in (KNOCK_OUT_SINGLE_ELIMINATION, KNOCK_OUT_DOUBLE_ELIMINATION):
+        raise ValueError("The knockout stage format must be single or double elimination")
+    has_group_stage = group_stage_format_id != 1
+    if num_groups == 'Auto':
+        num_groups = auto_num_groups(num_players)
+    if has_group_stage and not 1 <= num_groups <= num_players:
+        raise ValueError("The number of groups must be between 1 and the number of players")
+
+    np_rng = np.random.default_rng(seed)
+    rng = random.Random(seed)
+    match_player = MatchPlayer(strengths, rng)
+
+    advanced = np.zeros(num_players)
+    won = np.zeros(num_players)
+    knockout_rounds = np.zeros(num_players)
+    group_matches = tiebreaker_matches = knockout_matches = 0
+    finished = 0
+    brackets = {}  # entrants -> Bracket
+    double_elimination = knock_out_stage_format_id == KNOCK_OUT_DOUBLE_ELIMINATION
+
+    if has_group_stage:
+        draws, all_points, orders, group_matches = simulate_group_stage(np_rng, np.asarray(match_player.win_prob), num_simulations, num_groups, group_stage_format_id)
+        group_sizes = [len(range(group, num_players, num_groups)) for group in range(num_groups)]
+        draws, all_points, orders = draws.tolist(), all_points.tolist(), orders.tolist()
+
+    for simulation in range(num_simulations):
+        reached = {}
+        if has_group_stage:
+            points = all_points[simulation]
+            ranked = [draws[simulation][position] for position in orders[simulation]]
+            rankings = []
+            start = 0
+            for group, size in enumerate(group_sizes):
+                player_ids = ranked[start:start + size]
+                rankings.append((group, player_ids, [points[player] for player in player_ids]))
+                start += size
+            rankings, num_tiebreakers = play_tiebreakers(match_player, rankings, points, advancing_players)
+            tiebreaker_matches += num_tiebreakers
+            seeds = group_seeds(rankings, advancing_players)
+        else:
+            # Randomly seeded, like create_first_knockout_round
+            seeds = list(range(num_players))
+            rng.shuffle(seeds)
+
+        champion, num_matches = None, 0
+        if seeds:
+            if len(seeds) not in brackets:
+                brackets[len(seeds)] = Bracket(len(seeds), double_elimination)
+            champion, num_matches = brackets[len(seeds)].play(match_player, seeds, reached)
+        knockout_matches += num_matches
+        for player, knockout_round in reached.items():
+            advanced[player] += 1
+            knockout_rounds[player] += knockout_round
+        if champion is not None:
+            won[champion] += 1
+            finished += 1
+
+    strength_rank = np.argsort(np.argsort(-np.asarray(strengths, dtype=float), kind='stable'), kind='stable')
+    total_matches = group_matches * num_simulations + tiebreaker_matches + knockout_matches
+    return {
+        "simulations": num_simulations,
+        "num_groups": num_groups if has_group_stage else 0,
+        "finished_rate": finished / num_simulations,
+        "strongest_player_win_rate": float(won[strength_rank == 0].sum() / num_simulations),
+        "champion_mean_strength_rank": float((won * (strength_rank + 1)).sum() / finished) if finished else None,
+        "expected_matches": {
+            "group_stage": float(group_matches),
+            "tiebreakers": tiebreaker_matches / num_simulations,
+            "knockout": knockout_matches / num_simulations,
+            "total": total_matches / num_simulations,
+        },
+        "players": [{
+            "index": player,
+            "strength": float(strengths[player]),
+            "advance_probability": float(advanced[player] / num_simulations),
+            "win_probability": float(won[player] / num_simulations),
+            "expected_knockout_rounds": float(knockout_rounds[player] / num_simulations),
+        } for player in range(num_players)],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulate tournaments to compare formats, group counts and advancing players")
+    parser.add_argument('--strengths', help="Comma separated player ratings; overrides --players/--spread")
+    parser.add_argument('--players', type=int, default=16)
+    parser.add_argument('--spread', type=float, default=200, help="Standard deviation of the generated ratings")
+    parser.add_argument('--group-stage-format', type=int, default=2, choices=(1, 2, 3))
+    parser.add_argument('--knock-out-stage-format', type=int, default=2, choices=(2, 3))
+    parser.add_argument('--groups', default='Auto')
+    parser.add_argument('--advancing', type=int, default=2)
+    parser.add_argument('--simulations', type=int, default=10000)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    if args.strengths:
+        strengths = [float(value) for value in args.strengths.split(',')]
+    else:
+        strengths = sorted(np.random.default_rng(args.seed).normal(1500, args.spread, args.players).round().tolist(), reverse=True)
+
+    start = time.perf_counter()
+    report = simulate(strengths, args.group_stage_format, args.knock_out_stage_format,
+                      args.groups if args.groups == 'Auto' else int(args.groups), args.advancing, args.simulations, args.seed)
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from sqlalchemy import bindparam, insert, select
+from models import db, Group, GroupPlayer, GroupStanding, Round, Match
+
+# Group standings only count the group-stage round; tiebreakers are played in it as well
+GROUP_STAGE_ROUND_NUMBER = 1
+
+
+def tally_results(results):
+    # Single pass over (player1_id, player2_id, player3_id, winner_id, second_place_id) rows.
+    # A win is worth a point, a second place half a point; matches without a winner are not played yet
+    totals = defaultdict(lambda: [0, 0, 0])  # points, played, won
+    for player1_id, player2_id, player3_id, winner_id, second_place_id in results:
+        if winner_id is None:
+            continue
+        for player_id in (player1_id, player2_id, player3_id):
+            if player_id is not None:
+                totals[player_id][1] += 1
+        totals[winner_id][0] += 1
+        totals[winner_id][2] += 1
+        if second_place_id is not None:
+            totals[second_place_id][0] += 0.5
+    return totals
+
+
+def group_rankings(tournament_id, session=None):
+    # Pairing engine input: [(group_id, player_ids, points)] ordered by group, each group sorted by
+    # points. Tied players keep the order they were drawn into the group
+    rows = (session or db.session).query(GroupStanding.group_id, GroupStanding.player_id, GroupStanding.points).filter_by(
+        tournament_id=tournament_id
+    ).order_by(GroupStanding.group_id, GroupStanding.points.desc(), GroupStanding.group_player_id).all()
+
+    rankings = []
+    for group_id, group_rows in groupby(rows, key=itemgetter(0)):
+        group_rows = list(group_rows)
+        rankings.append((group_id, [row[1] for row in group_rows], [row[2] for row in group_rows]))
+    return rankings
+
+
+def add_group_standings(tournament_id):
+    # Zeroed rows for every group player of a freshly drawn tournament, in one INSERT ... SELECT
+    db.session.execute(insert(GroupStanding).from_select(
+        ["group_player_id", "tournament_id", "group_id", "player_id"],
+        select(GroupPlayer.group_player_id, Group.tournament_id, GroupPlayer.group_id, GroupPlayer.player_id)
+        .join(Group, Group.group_id == GroupPlayer.group_id)
+        .where(Group.tournament_id == tournament_id)
+    ))
+
+
+def record_results(changed_matches):
+    # Apply the difference between the old and new results of [(match, previous_winner_id, previous_second_place_id)]
+    # to the standings in the caller's transaction, with one executemany UPDATE for all affected players
+    changes = defaultdict(lambda: [0, 0, 0])  # (tournament_id, player_id) -> points, played, won
+    for match, previous_winner_id, previous_second_place_id in changed_matches:
+        match_round = db.session.get(Round, match.round_id)
+        if match_round is None or match_round.round_number != GROUP_STAGE_ROUND_NUMBER:
+            continue
+        players = (match.player1_id, match.player2_id, match.player3_id)
+        before = tally_results([players + (previous_winner_id, previous_second_place_id)])
+        after = tally_results([players + (match.winner_id, match.second_place_id)])
+        for player_id in set(before) | set(after):
+            change = changes[(match_round.tournament_id, player_id)]
+            for i, (new, old) in enumerate(zip(after.get(player_id, (0, 0, 0)), before.get(player_id, (0, 0, 0)))):
+                change[i] += new - old
+
+    rows = [{
+        "b_tournament_id": tournament_id,
+        "b_player_id": player_id,
+        "b_points": points,
+        "b_played": played,
+        "b_won": won
+    } for (tournament_id, player_id), (points, played, won) in changes.items() if points or played or won]
+    if rows:
+        standings = GroupStanding.__table__
+        db.session.execute(
+            standings.update()
+            .where(standings.c.tournament_id == bindparam('b_tournament_id'), standings.c.player_id == bindparam('b_player_id'))
+            .values(
+                points=standings.c.points + bindparam('b_points'),
+                played=standings.c.played + bindparam('b_played'),
+                won=standings.c.won + bindparam('b_won')
+            ),
+            rows
+        )
+
+
+def rebuild_group_standings(tournament_id=None):
+    # Recreate the standings rows from the matches table, for one tournament or all of them
+    delete_query = GroupStanding.query
+    group_players_query = db.session.query(GroupPlayer.group_player_id, Group.tournament_id, GroupPlayer.group_id, GroupPlayer.player_id).join(Group)
+    results_query = db.session.query(
+        Round.tournament_id, Match.player1_id, Match.player2_id, Match.player3_id, Match.winner_id, Match.second_place_id
+    ).join(Round, Round.round_id == Match.round_id).filter(Round.round_number == GROUP_STAGE_ROUND_NUMBER)
+    if tournament_id is not None:
+        delete_query = delete_query.filter_by(tournament_id=tournament_id)
+        group_players_query = group_players_query.filter(Group.tournament_id == tournament_id)
+        results_query = results_query.filter(Round.tournament_id == tournament_id)
+
+    results_by_tournament = defaultdict(list)
+    for row in results_query:
+        results_by_tournament[row[0]].append(tuple(row[1:]))
+    totals = {tid: tally_results(results) for tid, results in results_by_tournament.items()}
+
+    rows = []
+    for group_player_id, tid, group_id, player_id in group_players_query:
+        points, played, won = totals.get(tid, {}).get(player_id, (0, 0, 0))
+        rows.append({
+            "group_player_id": group_player_id,
+            "tournament_id": tid,
+            "group_id": group_id,
+            "player_id": player_id,
+            "points": points,
+            "played": played,
+            "won": won
+        })
+
+    delete_query.delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(GroupStanding), rows)
+    return len(rows)
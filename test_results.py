@@ -0,0 +1,49 @@
+import os
+import unittest
+
+os.environ['DATABASE_URL'] = 'sqlite:///:memory:'
+
+from app import app
+from models import db, GroupStageFormat, KnockOutStageFormat, Player, PlayerStats, RatingChange
+
+
+class BatchResultsTest(unittest.TestCase):
+    def setUp(self):
+        app.testing = True
+        self.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            for format_id in (1, 2, 3):
+                db.session.add(GroupStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+                db.session.add(KnockOutStageFormat(format_id=format_id, format_name=f"Format {format_id}"))
+            for i in range(1, 5):
+                db.session.add(Player(name=f"Player {i}"))
+            db.session.commit()
+        response = self.client.post('/api/create-tournament', json={
+            'name': 'Batch', 'group_stage_format_id': '2', 'knock_out_stage_format_id': '2',
+            'num_groups': 1, 'advancing_players': 2, 'players': [1, 2, 3, 4]
+        })
+        self.tournament_id = response.get_json()['tournament_id']
+        self.matches = self.client.get(f'/api/tournaments/{self.tournament_id}/matches').get_json()
+
+    def test_duplicate_match_in_batch(self):
+        match = self.matches[0]
+        winner_id = match['player1']['player_id']
+        response = self.client.put(f'/api/tournaments/{self.tournament_id}/results', json=[
+            {'match_id': match['match_id'], 'winner_id': winner_id},
+            {'match_id': match['match_id'], 'winner_id': winner_id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        statuses = response.get_json()['results']
+        self.assertEqual([status['status'] for status in statuses], ['updated', 'error'])
+        self.assertEqual(statuses[1]['error'], "Duplicate match_id in batch")
+
+        # The result is counted once
+        with app.app_context():
+            self.assertEqual(db.session.get(PlayerStats, winner_id).matches_played, 1)
+            self.assertEqual(RatingChange.query.filter_by(match_id=match['match_id']).count(), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
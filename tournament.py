@@ -1,10 +1,21 @@
 from flask import jsonify, make_response
 from datetime import datetime
 from pytz import timezone
+from sqlalchemy import insert, update
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from models import db, Player, Tournament, Group, GroupPlayer, Round, Match
+from sqlalchemy.orm.attributes import flag_modified
+from models import db, Player, Tournament, Group, GroupPlayer, Round, Match, PHASE_GROUP, PHASE_TIEBREAK, PHASE_KNOCKOUT
+from standings import group_rankings, add_group_standings, record_results
+from player_stats import add_tournament_entries, record_player_results
+from ratings import record_ratings
+from bracket import create_bracket, has_bracket, ready_slots, record_bracket_results
+from knockout import add_knockout_players, active_knockout_players, record_knockout_results, rebuild_knockout_players
+from pairing import Pairing, random_pairings, knockout_pairings, elimination_pairings, tiebreaker_pairings, group_seeds, KNOCK_OUT_SINGLE_ELIMINATION, KNOCK_OUT_DOUBLE_ELIMINATION
+import logging
 import random
 
+log = logging.getLogger(__name__)
+
 def create_tournament(data):
     name = data['name']
     group_stage_format_id = data['group_stage_format_id']
@@ -25,7 +36,8 @@ def create_tournament(data):
         date = datetime.now(cet).date()
 
         # Create a new tournament
-        tournament = Tournament(name=name, group_stage_format_id=group_stage_format_id, knock_out_stage_format_id=knock_out_stage_format_id, date=date, advancing_players=advancing_players)
+        phase = PHASE_KNOCKOUT if group_stage_format_id == '1' else PHASE_GROUP
+        tournament = Tournament(name=name, group_stage_format_id=group_stage_format_id, knock_out_stage_format_id=knock_out_stage_format_id, date=date, advancing_players=advancing_players, phase=phase)
         db.session.add(tournament)
         db.session.flush()  # Flush to get the tournament ID
 
@@ -33,107 +45,142 @@ def create_tournament(data):
         first_round = Round(tournament_id=tournament.tournament_id, round_number=1)
         db.session.add(first_round)
         db.session.flush()  # Flush to get the round ID
+        tournament.current_round_id = first_round.round_id
 
         # Apply specific logic based on the format
         if group_stage_format_id == '1':
-            create_knockout_stage(tournament.tournament_id, selected_players, first_round.round_number)
+            create_first_knockout_round(tournament.tournament_id, [player.player_id for player in selected_players], first_round.round_id, knock_out_stage_format_id)
         elif num_groups == 'Auto':
             create_groups_auto(tournament.tournament_id, selected_players, first_round.round_id, group_stage_format_id)
         else:
             create_groups(tournament.tournament_id, selected_players, num_groups, first_round.round_id, group_stage_format_id)
+        add_tournament_entries([player.player_id for player in selected_players])
 
         db.session.commit()  # Commit transaction
         return tournament.tournament_id
 
     except (SQLAlchemyError, IntegrityError) as e:
-        print(f"SQLAlchemyError: {e}")
+        log.exception("Database error creating tournament %r", name)
         return jsonify({"error": "Database error occurred"}), 500
 
     except ValueError as e:
-        print(f"ValueError: {e}")
+        log.warning("Invalid tournament %r: %s", name, e)
         return jsonify({"error": str(e)}), 400
 
     except Exception as e:
-        print(f"Error: {e}")
+        log.exception("Unexpected error creating tournament %r", name)
         return jsonify({"error": "An unexpected error occurred"}), 500
     
-def create_knockout_stage(tournament_id, players, round_number, num_advancing_players):
-    # Create matches for the knockout stage
-    advancing_players = []
-    current_round = Round.query.filter_by(tournament_id=tournament_id, round_number=round_number).first()
-    print(f"Current Round: {current_round}")
-
-    if num_advancing_players:
-        print(f"Round Number: {round_number}")
-
-        if current_round is not None:
-            next_round_number = round_number + 1
-            next_round = Round(tournament_id=tournament_id, round_number=next_round_number)
-            db.session.add(next_round)
-            db.session.flush()  # Flush to get the next_round.round_id
-
-            print(f"Next Round: {next_round} - Number: {next_round_number}")
-
-            matches_in_round = Match.query.filter_by(round_id=current_round.round_id).all()
-            print(f"Matches in Current Round: {matches_in_round}")
-
-            groups = Group.query.filter_by(tournament_id=tournament_id).all()
-            group_players = []
-
-            for group in groups:
-                group_winners = []
-                for gp in group.players:
-                    player = gp.player
-                    matches_won = sum(1 for match in matches_in_round if match.winner_id == player.player_id)
-                    matches_won += sum(0.5 for match in matches_in_round if match.second_place_id == player.player_id)
-                    group_winners.append({
-                        "player": player,
-                        "matches_won": matches_won,
-                        "group_id": group.group_id
-                    })
-                sorted_winners = sorted(group_winners, key=lambda p: p['matches_won'], reverse=True)
-                group_players.append(sorted_winners[:num_advancing_players])  # Top players from each group
-                print(f"Group Winners for Group {group.group_id}: {sorted_winners[:num_advancing_players]}")
-
-            if len(groups) == 1:
-                # Special case for single group
-                single_group_players = group_players[0]
-                for i in range(0, len(single_group_players), 2):
-                    if i + 1 < len(single_group_players):
-                        match = Match(tournament_id=tournament_id, round_id=next_round.round_id, player1_id=single_group_players[i]['player'].player_id, player2_id=single_group_players[i + 1]['player'].player_id)
-                        print(f"Match: Player 1 : {single_group_players[i]['player'].player_id}, Player 2: {single_group_players[i + 1]['player'].player_id}")
-                        db.session.add(match)
-            else:
-                # Ensure correct matching between groups
-                first_seeds = [(group[0]['player'], group[0]['group_id']) for group in group_players if len(group) > 0]
-                second_seeds = [(group[1]['player'], group[1]['group_id']) for group in group_players if len(group) > 1]
-
-                print(f"First Seeds: {first_seeds}")
-                print(f"Second Seeds: {second_seeds}")
-
-                # Match second seed with first seed from another group
-                for first_seed in first_seeds:
-                    for second_seed in second_seeds:
-                        if first_seed[1] != second_seed[1]:  # Ensure different groups
-                            match = Match(tournament_id=tournament_id, round_id=next_round.round_id, player1_id=second_seed[0].player_id, player2_id=first_seed[0].player_id)
-                            print(f"Match: Player 1 : {second_seed[0].player_id}, Player 2: {first_seed[0].player_id}")
-                            db.session.add(match)
-                            second_seeds.remove(second_seed)  # Remove matched second seed
-                            break
-
-
-    else:
-        # Randomly match players if there's no group stage
-        random.shuffle(players) 
-        for i in range(0, len(players), 2):
-            if i + 1 < len(players):
-                match = Match(tournament_id=tournament_id, round_id=current_round.round_id, player1_id=players[i].player_id, player2_id=players[i + 1].player_id)
-                db.session.add(match)
-    db.session.commit()
+def set_match_results(updates):
+    # Stores [(match, winner_id, second_place_id)] and keeps the standings, career stats and ratings in step, in the
+    # caller's transaction. Returns the stored results, readable after the commit has expired the matches.
+    # The flush checks each match's version, a match another request wrote meanwhile raises StaleDataError
+    changed_matches = []
+    for match, winner_id, second_place_id in updates:
+        changed_matches.append((match, match.winner_id, match.second_place_id))
+        match.winner_id = winner_id
+        if second_place_id:
+            match.second_place_id = second_place_id
+        # Written even when unchanged, so a repeated result is checked against the version as well
+        flag_modified(match, 'winner_id')
     db.session.flush()
-
-
-
+    played = {}
+    for match, previous_winner_id, _ in changed_matches:
+        # Through the round: group matches of older tournaments have no tournament_id of their own
+        tournament_id = db.session.get(Round, match.round_id).tournament_id
+        played[tournament_id] = played.get(tournament_id, 0) + (match.winner_id is not None) - (previous_winner_id is not None)
+    for tournament_id, count in played.items():
+        if count:
+            count_matches(tournament_id, played=count)
+    record_results(changed_matches)
+    # The bracket first: whether a grand final ended the tournament depends on the reset it settles
+    record_bracket_results(changed_matches)
+    record_player_results(changed_matches)
+    record_ratings(changed_matches)
+    record_knockout_results(changed_matches)
+    return [{
+        "match_id": match.match_id,
+        "round_id": match.round_id,
+        "winner_id": match.winner_id,
+        "second_place_id": match.second_place_id,
+        "version": match.version
+    } for match, _, _ in changed_matches]
+
+def count_matches(tournament_id, total=0, played=0):
+    # Incremented in SQL, so concurrent result writes can't lose a count
+    db.session.execute(
+        update(Tournament)
+        .where(Tournament.tournament_id == tournament_id)
+        .values(matches_total=Tournament.matches_total + total, matches_played=Tournament.matches_played + played)
+        .execution_options(synchronize_session=False)
+    )
+
+def save_pairings(tournament_id, round_id, pairings):
+    # Persistence side of the pairing engine: one batch of new matches, flushed together and
+    # left for the caller to commit
+    matches = [Match(
+        tournament_id=tournament_id,
+        round_id=round_id,
+        player1_id=pairing.player1_id,
+        player2_id=pairing.player2_id,
+        player3_id=pairing.player3_id
+    ) for pairing in pairings]
+    db.session.add_all(matches)
+    db.session.flush()
+    if matches:
+        count_matches(tournament_id, total=len(matches))
+    return matches
+
+def is_bracket_format(format_id):
+    # The format id arrives as a string from the creation form and as an integer from the database
+    return str(format_id) in (str(KNOCK_OUT_SINGLE_ELIMINATION), str(KNOCK_OUT_DOUBLE_ELIMINATION))
+
+def is_double_elimination(format_id):
+    return str(format_id) == str(KNOCK_OUT_DOUBLE_ELIMINATION)
+
+def create_bracket_round(tournament_id, round_id, slots):
+    # Matches for the ready bracket slots, played in the given round
+    matches = save_pairings(tournament_id, round_id, [Pairing(slot.player1_id, slot.player2_id) for slot in slots])
+    for slot, match in zip(slots, matches):
+        slot.match_id = match.match_id
+    return matches
+
+def add_round(tournament_id, round_number):
+    # Knockout round that becomes the tournament's current one
+    next_round = Round(tournament_id=tournament_id, round_number=round_number)
+    db.session.add(next_round)
+    db.session.flush()  # Flush to get the round ID
+    tournament = db.session.get(Tournament, tournament_id)
+    tournament.current_round_id = next_round.round_id
+    tournament.phase = PHASE_KNOCKOUT
+    return next_round
+
+def create_first_knockout_round(tournament_id, player_ids, round_id, format_id):
+    # Randomly seeded bracket if there's no group stage
+    player_ids = list(player_ids)
+    random.shuffle(player_ids)
+    add_knockout_players(tournament_id, player_ids)
+    if not is_bracket_format(format_id):
+        return save_pairings(tournament_id, round_id, random_pairings(player_ids))
+    create_bracket(tournament_id, player_ids, is_double_elimination(format_id))
+    return create_bracket_round(tournament_id, round_id, ready_slots(tournament_id))
+
+def create_knockout_stage(tournament_id, round_number, num_advancing_players):
+    # First knockout round, with the whole bracket seeded from the group standings
+    current_round = Round.query.filter_by(tournament_id=tournament_id, round_number=round_number).first()
+    if current_round is None or not num_advancing_players:
+        return []
+
+    format_id = db.session.get(Tournament, tournament_id).knock_out_stage_format_id
+    if not is_bracket_format(format_id):
+        pairings = knockout_pairings(group_rankings(tournament_id), num_advancing_players)
+        add_knockout_players(tournament_id, [player_id for pairing in pairings for player_id in pairing.player_ids() if player_id is not None])
+        return save_pairings(tournament_id, add_round(tournament_id, round_number + 1).round_id, pairings) if pairings else []
+    seeds = group_seeds(group_rankings(tournament_id), num_advancing_players)
+    add_knockout_players(tournament_id, seeds)
+    create_bracket(tournament_id, seeds, is_double_elimination(format_id))
+    slots = ready_slots(tournament_id)
+    return create_bracket_round(tournament_id, add_round(tournament_id, round_number + 1).round_id, slots) if slots else []
 
 def create_groups_auto(tournament_id, players, round_id, format_id):
     num_players = len(players)
@@ -146,187 +193,68 @@ def create_groups_auto(tournament_id, players, round_id, format_id):
     create_groups(tournament_id, players, num_groups, round_id, format_id)
 
 def create_groups(tournament_id, players, num_groups, round_id, format_id):
-    print(f"Num Groups {num_groups}")
-    groups = []
-    for i in range(num_groups):
-        group = Group(tournament_id=tournament_id, group_name=f"Gruppe {i+1}", group_number=i+1)
-        groups.append(group)
-        db.session.add(group)
-    db.session.flush()
+    log.debug("Drawing %d players into %d groups", len(players), num_groups, extra={"tournament_id": tournament_id})
+    groups = [Group(tournament_id=tournament_id, group_name=f"Gruppe {i+1}", group_number=i+1) for i in range(num_groups)]
+    db.session.add_all(groups)
+    db.session.flush()  # Flush to get the group IDs
 
     random.shuffle(players)
 
+    # Group players and fixtures are plain rows written with executemany inserts, so the
+    # unit of work never tracks the O(n²) fixtures of large round robin groups
+    group_members = [[] for _ in groups]
+    group_player_rows = []
     for i, player in enumerate(players):
-        group = groups[i % num_groups]
-        group_player = GroupPlayer(group_id=group.group_id, player_id=player.player_id)
-        db.session.add(group_player)
-    db.session.flush()
-
-    for group in groups:
-        create_group_matches(group, round_id, format_id), 
-
-def create_group_matches(group, round_id, format_id):
-    players = group.players
+        group_index = i % num_groups
+        group_members[group_index].append(player.player_id)
+        group_player_rows.append({"group_id": groups[group_index].group_id, "player_id": player.player_id})
+    if group_player_rows:
+        db.session.execute(insert(GroupPlayer), group_player_rows)
+    add_group_standings(tournament_id)
+
+    match_rows = []
+    for group, player_ids in zip(groups, group_members):
+        match_rows.extend(group_match_rows(tournament_id, group.group_id, player_ids, round_id, format_id))
+    if match_rows:
+        db.session.execute(insert(Match), match_rows)
+        count_matches(tournament_id, total=len(match_rows))
+
+def group_match_rows(tournament_id, group_id, player_ids, round_id, format_id):
+    rows = []
     if format_id != '1':
-        for i in range(len(players)):
-            for j in range(i + 1, len(players)):
-                match = Match(round_id=round_id, group_id=group.group_id, player1_id=players[i].player_id, player2_id=players[j].player_id)
-                db.session.add(match)
+        for i in range(len(player_ids)):
+            for j in range(i + 1, len(player_ids)):
+                rows.append({"tournament_id": tournament_id, "round_id": round_id, "group_id": group_id, "player1_id": player_ids[i], "player2_id": player_ids[j]})
                 if format_id == '3':  # Each player should play each other twice
-                    reverse_match = Match(round_id=round_id, group_id=group.group_id, player1_id=players[j].player_id, player2_id=players[i].player_id)
-                    db.session.add(reverse_match)
-    db.session.flush()
+                    rows.append({"tournament_id": tournament_id, "round_id": round_id, "group_id": group_id, "player1_id": player_ids[j], "player2_id": player_ids[i]})
+    return rows
 
 
 def create_next_round_matches(current_round_id, tournament_id):
-    current_round = Round.query.filter_by(tournament_id=tournament_id, round_id=current_round_id).first()
+    # Next wave of the bracket, without a round once it has been played out. Tournaments from
+    # before the bracket tree pair the players still in, by the bracket they are in
+    current_round = db.session.get(Round, current_round_id)
     next_round_number = current_round.round_number + 1 if current_round else 1
-    next_round = Round(tournament_id=tournament_id, round_number=next_round_number)
-    db.session.add(next_round)
-    db.session.commit()
-    db.session.flush()  # Flush to get the round ID
 
-    print(f"Current Round: {current_round}")
-    print(f"Next Round Number: {next_round_number}")
-    print(f"Next Round: {next_round}")
-
-    next_round_matches = []
-
-    # Determine if the tournament has a group phase
-    tournament = Tournament.query.filter_by(tournament_id=tournament_id).first()
-    has_group_phase = tournament.group_stage_format_id != '1'
-    format_id = tournament.knock_out_stage_format_id
-
-    print(f"Tournament: {tournament}")
-    print(f"Format ID: {format_id}")
-
-    # Determine advancing players from the current round
-    matches_in_current_round = Match.query.filter_by(round_id=current_round_id).all()
-    advancing_players = [
-        match.winner_id for match in matches_in_current_round if match.winner_id is not None
-    ]
-
-    print(f"Matches in Current Round: {matches_in_current_round}")
-    print(f"Advancing Players: {advancing_players}")
-
-    if format_id == 2:  # Single elimination
-        print(f"In Single Elimination jetzt: {format_id}")
-        random.shuffle(advancing_players)
-        for i in range(0, len(advancing_players), 2):
-            if i + 1 < len(advancing_players):
-                match = Match(tournament_id=tournament_id, round_id=next_round.round_id, player1_id=advancing_players[i], player2_id=advancing_players[i+1])
-                next_round_matches.append(match)
-                db.session.add(match)
-        print(f"Single Elimination Matches: {next_round_matches}")
-    elif format_id == 3:  # Double elimination
-        winners = advancing_players
-        random.shuffle(winners)
-        for i in range(0, len(winners), 2):
-            if i + 1 < len(winners):
-                match = Match(tournament_id=tournament_id, round_id=next_round.round_id, player1_id=winners[i], player2_id=winners[i+1])
-                next_round_matches.append(match)
-                db.session.add(match)
-        print(f"Double Elimination Matches (Winners): {next_round_matches}")
-
-        # Handle losers' bracket
-        if next_round_number > 1 or not has_group_phase:  # Consider only losses in knockout rounds if there was a group phase
-            previous_round = Round.query.filter_by(tournament_id=tournament_id, round_number=next_round_number - 1).first()
-            if previous_round:
-                previous_matches = Match.query.filter_by(round_id=previous_round.round_id).all()
-                print(f"Previous Round: {previous_round}")
-                print(f"Previous Matches: {previous_matches}")
-
-                # Track the number of losses for each player
-                player_losses = {}
-                for match in previous_matches:
-                    if match.loser_id:
-                        if match.loser_id not in player_losses:
-                            player_losses[match.loser_id] = 1
-                        else:
-                            player_losses[match.loser_id] += 1
-                print(f"Player Losses: {player_losses}")
-
-                # Collect players with only one loss
-                losers = [match.loser_id for match in previous_matches if match.loser_id and player_losses[match.loser_id] == 1]
-                random.shuffle(losers)
-                print(f"Losers: {losers}")
-
-                for i in range(0, len(losers), 2):
-                    if i + 1 < len(losers):
-                        match = Match(tournament_id=tournament_id, round_id=next_round.round_id, player1_id=losers[i], player2_id=losers[i+1])
-                        next_round_matches.append(match)
-                        db.session.add(match)
-        print(f"Double Elimination Matches (Losers): {next_round_matches}")
-
-    db.session.commit()
-    print(f"Created matches for round {next_round_number}: {next_round_matches}")
-    return next_round_matches
+    if has_bracket(tournament_id):
+        slots = ready_slots(tournament_id)
+        return create_bracket_round(tournament_id, add_round(tournament_id, next_round_number).round_id, slots) if slots else []
 
+    format_id = db.session.get(Tournament, tournament_id).knock_out_stage_format_id
+    active_players = active_knockout_players(tournament_id)
+    if not active_players:
+        # A knockout started before the state was kept
+        rebuild_knockout_players(tournament_id)
+        active_players = active_knockout_players(tournament_id)
+    pairings = elimination_pairings(format_id, active_players)
+    if not pairings:
+        return []
+    return save_pairings(tournament_id, add_round(tournament_id, next_round_number).round_id, pairings)
 
-def create_tiebreaker_matches(tournament_id, current_round_id, num_advancing_players):
-    current_round = Round.query.filter_by(tournament_id=tournament_id, round_id=current_round_id).first()
-    matches_in_round = Match.query.filter_by(round_id=current_round.round_id).all()
-
-    groups = Group.query.filter_by(tournament_id=tournament_id).all()
-    tiebreaker_matches = []
-
-    for group in groups:
-        group_winners = []
-        for gp in group.players:
-            player = gp.player
-            matches_won = sum(1 for match in matches_in_round if match.winner_id == player.player_id)
-            matches_won += sum(0.5 for match in matches_in_round if match.second_place_id == player.player_id)
-            group_winners.append({
-                "player": player,
-                "matches_won": matches_won
-            })
-            print(f"Sorted Winners {player}: {matches_won}")
-        sorted_winners = sorted(group_winners, key=lambda p: p['matches_won'], reverse=True)
-        for winner in sorted_winners:
-            print(f"{winner}")
-
-        if len(sorted_winners) <= num_advancing_players:
-            print(f"Abbruch getriggert, Sorted Winners <= Advancing players")
-            continue
-
-        # Identify the top win counts for advancing players
-        top_win_counts = sorted(set(p['matches_won'] for p in sorted_winners), reverse=True)[:num_advancing_players]
-        relevant_tied_players = []
-        for win_count in top_win_counts:
-            players_with_win_count = [p for p in sorted_winners if p['matches_won'] == win_count]
-            if len(players_with_win_count) > 1:
-                relevant_tied_players.extend(players_with_win_count)
-            if len(relevant_tied_players) >= num_advancing_players:
-                break
-
-        # Special case: if only one group and advancing players is 2, no tiebreaker needed for ties between 1st and 2nd place
-        if len(relevant_tied_players) == 2 and num_advancing_players == 2:
-            continue
-
-        if len(relevant_tied_players) > 1 and len(relevant_tied_players) > num_advancing_players:
-            # Handle 3-player match for uneven number of ties first
-            if len(relevant_tied_players) % 2 == 1:
-                print(f"Three Player handle triggered in {group.group_number}")
-
-                match = Match(
-                    tournament_id=tournament_id,
-                    round_id=current_round.round_id,
-                    player1_id=relevant_tied_players[-3]['player'].player_id,
-                    player2_id=relevant_tied_players[-2]['player'].player_id,
-                    player3_id=relevant_tied_players[-1]['player'].player_id
-                )
-                tiebreaker_matches.append(match)
-                db.session.add(match)
-
-                relevant_tied_players = relevant_tied_players[:-3]  # Remove the last 3 players from the ties list
-
-            # Handle 2-player matches
-            for i in range(0, len(relevant_tied_players), 2):
-                match = Match(tournament_id=tournament_id, round_id=current_round.round_id, player1_id=relevant_tied_players[i]['player'].player_id, player2_id=relevant_tied_players[i + 1]['player'].player_id)
-                tiebreaker_matches.append(match)
-                db.session.add(match)
-
-    db.session.commit()
-    print(f"Tiebreaker matches created: {tiebreaker_matches}")
-    return tiebreaker_matches
 
+def create_tiebreaker_matches(tournament_id, current_round_id, num_advancing_players):
+    # Tiebreakers are played in the group-stage round they decide
+    matches = save_pairings(tournament_id, current_round_id, tiebreaker_pairings(group_rankings(tournament_id), num_advancing_players))
+    if matches:
+        db.session.get(Tournament, tournament_id).phase = PHASE_TIEBREAK
+    return matches
@@ -0,0 +1,83 @@
+from functools import wraps
+from flask import make_response, request
+from sqlalchemy import or_, update
+from models import db, Tournament, Round, Match
+
+
+class VersionConflict(Exception):
+    pass
+
+
+def bump_version(tournament_id, expected_version=None):
+    # Part of the caller's transaction, so the new version becomes visible together with the write.
+    # With expected_version it is a compare-and-swap that fails when another write moved the version
+    # on since the client read it
+    query = update(Tournament).where(Tournament.tournament_id == tournament_id)
+    if expected_version is not None:
+        query = query.where(Tournament.version == expected_version)
+    result = db.session.execute(query.values(version=Tournament.version + 1).execution_options(synchronize_session=False))
+    if expected_version is not None and result.rowcount != 1:
+        raise VersionConflict(f"Tournament {tournament_id} has changed since version {expected_version}")
+
+
+def expected_version(tournament_id):
+    # Version named by the request's If-Match header, which carries an ETag of the tournament's GET
+    # endpoints. None without the header or with "*"
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    prefix = f"{tournament_id}."
+    for etag in request.if_match:
+        if etag.startswith(prefix) and etag[len(prefix):].isdigit():
+            return int(etag[len(prefix):])
+    raise VersionConflict(f"If-Match names no version of tournament {tournament_id}")
+
+
+def bump_player_versions(player_id):
+    # A player's name shows up in every tournament they played in; returns those tournaments
+    tournament_ids = [tournament_id for (tournament_id,) in db.session.query(Round.tournament_id).join(
+        Match, Match.round_id == Round.round_id
+    ).filter(
+        or_(Match.player1_id == player_id, Match.player2_id == player_id, Match.player3_id == player_id)
+    ).distinct()]
+    if tournament_ids:
+        db.session.execute(
+            update(Tournament)
+            .where(Tournament.tournament_id.in_(tournament_ids))
+            .values(version=Tournament.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    return tournament_ids
+
+
+def tournament_etag(cached_version=None):
+    # Answers GET requests whose If-None-Match still matches the tournament's version with a 304,
+    # before the view runs any match or player queries. cached_version may supply a version
+    # without touching the database, e.g. from an in-process cache
+    def decorator(view):
+        @wraps(view)
+        def wrapper(tournament_id, *args, **kwargs):
+            if request.method != 'GET':
+                return view(tournament_id, *args, **kwargs)
+
+            version = cached_version(tournament_id) if cached_version else None
+            if version is None:
+                # The whole row, which the view then gets from the session without another query
+                tournament = db.session.get(Tournament, tournament_id)
+                version = tournament.version if tournament else None
+            if version is None:
+                return view(tournament_id, *args, **kwargs)
+
+            etag = f"{tournament_id}.{version}"
+            if etag in request.if_none_match:
+                response = make_response('', 304)
+            else:
+                response = make_response(view(tournament_id, *args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            # A view that serves cached data tags it with the version of that data itself
+            if 'ETag' not in response.headers:
+                response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator